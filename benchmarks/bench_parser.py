@@ -0,0 +1,111 @@
+"""Parser Benchmarks
+
+Times the parsing engines on deeply nested equations, on malformed
+equations, and on edits of a long equation with an incremental parser.
+
+Run from the repository root with:
+
+    python benchmarks/bench_parser.py
+
+Written by Sam Hubbard - samlhub@gmail.com
+Copyright (C) 2015 Sam Hubbard
+"""
+
+import os
+import sys
+import time
+
+sys.path.insert(
+    0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from abstract_syntax_tree import *
+
+
+# The number of times each parse is repeated. The best time is shown.
+REPEATS = 5
+# Nesting depths of |((...(z - 1)...))| = 2. Parsing without the memo
+# takes seconds at a depth of 2, so deeper equations are skipped.
+DEPTHS = [2, 20, 60]
+NAIVE_DEPTHS = [1, 2]
+# Sizes of the malformed equations.
+SIZES = [8, 16, 32, 64]
+# A long equation, which is edited in the middle.
+LONG_EQUATION = "|" + " + ".join(
+    "(z * %d - %dj) / (z + %d)" % (i, i, i + 1) for i in range(60)) + "| < 5"
+
+
+def best_time(function, repeats=REPEATS):
+    """Find the shortest time taken by a function, in milliseconds."""
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+    return min(times) * 1000
+
+
+def parse_time(equation, repeats=REPEATS, **options):
+    """Time parsing an equation with a fresh SyntaxParser."""
+    return best_time(
+        lambda: SyntaxParser(equation, **options).get_tree(), repeats)
+
+
+def nested(depth):
+    """Build an equation with brackets nested depth deep."""
+    return "|" + "(" * depth + "z-1" + ")" * depth + "| = 2"
+
+
+def bench_nesting():
+    """Time deeply nested equations, with and without the memo."""
+    print("Nested brackets, ms")
+    for depth in NAIVE_DEPTHS:
+        print("  depth %-3d naive    %10.2f" % (
+            depth, parse_time(nested(depth), 1, memoize=False)))
+    for depth in DEPTHS:
+        print("  depth %-3d packrat  %10.2f" % (
+            depth, parse_time(nested(depth))))
+        print("  depth %-3d pratt    %10.2f" % (
+            depth, parse_time(nested(depth), engine=ENGINE_PRATT)))
+
+
+def bench_malformed():
+    """Time malformed equations, which should fail in linear time."""
+    print("Malformed equations, packrat/pratt ms")
+    for size in SIZES:
+        cases = [
+            ("unclosed", "(" * size + "z = 1"),
+            ("trailing", "z" + "+z" * size + " = "),
+            ("bars", "|" * size + "z = 1"),
+            ("operators", "z " + "+ " * size + "= 1")]
+        print("  n=%-3d " % size + "  ".join(
+            "%s %.2f/%.2f" % (
+                name, parse_time(equation),
+                parse_time(equation, engine=ENGINE_PRATT))
+            for name, equation in cases))
+
+
+def bench_incremental():
+    """Time edits in the middle of a long equation."""
+    middle = len(LONG_EQUATION) // 2
+    print("Edits of a %d token equation, incremental/fresh ms" % len(
+        tokenize(LONG_EQUATION)))
+    for name, edit in [("valid", " + 7 "), ("invalid", " + * ")]:
+        equation = LONG_EQUATION[:middle] + edit + LONG_EQUATION[middle:]
+        parser = SyntaxParser(LONG_EQUATION, incremental=True)
+
+        def update():
+            # Parse the original equation again, so each edit is timed
+            # from the same memo.
+            parser.update(LONG_EQUATION)
+            start = time.perf_counter()
+            parser.update(equation)
+            return time.perf_counter() - start
+
+        incremental = min(update() for _ in range(REPEATS)) * 1000
+        print("  %-8s %.2f/%.2f" % (name, incremental, parse_time(equation)))
+
+
+if __name__ == "__main__":
+    bench_nesting()
+    bench_malformed()
+    bench_incremental()
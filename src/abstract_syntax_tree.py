@@ -8,78 +8,482 @@ Copyright (C) 2015 Sam Hubbard
 """
 
 import cmath
-import inspect
+import operator
 import re
 from collections import namedtuple
 
+try:
+    import numpy
+except ImportError:
+    # Vectorized evaluation is unavailable without NumPy.
+    numpy = None
 
-TOKENS = {
-    "(": "LPAR",
-    ")": "RPAR",
-    "|": "MOD",
-    ">": "MORE",
-    ">=": "MEQL",
-    "=": "EQL",
-    "<=": "LEQL",
-    "<": "LESS",
-    "-": "SUB",
-    "+": "ADD",
-    "*": "MUL",
-    "/": "DIV",
-    "^": "EXP",
-    "sin": "SIN",
-    "cos": "COS",
-    "tan": "TAN",
-    "sqrt": "SQRT",
-    "arg": "ARG"
-}
-CODE = {
-    "MORE": lambda x, y: x.real > y.real,
-    "MEQL": lambda x, y: x.real >= y.real,
-    "EQL":  lambda x, y: x == y,
-    "LEQL": lambda x, y: x.real <= y.real,
-    "LESS": lambda x, y: x.real < y.real,
-    "add": lambda x, y: x + y,
-    "sub": lambda x, y: x - y,
-    "mul": lambda x, y: x * y,
-    "div": lambda x, y: x / y,
-    "exp": lambda x, y: x ** y,
-    "mod": lambda x: abs(x),
-    "pos": lambda x: x,
-    "neg": lambda x: -x,
-    "SIN": lambda x: cmath.sin(x),
-    "COS": lambda x: cmath.cos(x),
-    "TAN": lambda x: cmath.tan(x),
-    "SQRT": lambda x: cmath.sqrt(x),
-    "ARG": lambda x: cmath.phase(x)
-}
-FUNCTIONS = ["SIN", "COS", "TAN", "SQRT", "ARG"]
-GRAMMAR = {
-    "eqn": ["add rel add"],
-    "rel": ["MORE", "MEQL", "EQL", "LEQL", "LESS"],
-    "add": ["sub ADD add", "sub"],
-    "sub": ["mul SUB sub", "mul"],
-    "mul": ["div MUL mul", "div"],
-    "div": ["exp DIV div", "exp"],
-    "exp": ["atm EXP exp", "atm"],
-    "atm": ["NUM", "VAR", "par", "mod", "neg", "pos", "fun"],
-    "par": ["LPAR add RPAR"],
-    "mod": ["MOD add MOD"],
-    "neg": ["SUB atm"],
-    "pos": ["ADD atm"],
-    "fun": [fun + " atm" for fun in FUNCTIONS]
-}
-LEFT_ASSOCIATIVE = ["sub", "div"]
-
-
-Token = namedtuple("Token", ["name", "value"])
-Match = namedtuple("Match", ["rule", "matched"])
+from exact import ExactComplex
+from dual import *
+
+
+# Kinds of operator, which decide where they appear in the grammar.
+OPERATOR_RELATION = 0
+OPERATOR_BINARY = 1
+OPERATOR_PREFIX = 2
+OPERATOR_BRACKET = 3
+OPERATOR_FUNCTION = 4
+# Conjunctions join chained relations, and have no token of their own.
+OPERATOR_CONJUNCTION = 5
+
+
+class Operator:
+    """An operator or function which can appear in equations.
+
+    Attributes:
+        name: The name of the operator, which is also its grammar rule.
+        kind: One of the OPERATOR_* constants.
+        arity: The number of arguments the operator takes.
+        scalar: Function applying the operator to numbers. Nodes store
+            this function, so it must be unique to the operator.
+        vector: Function applying the operator to NumPy arrays, or None
+            to fall back on numpy.vectorize.
+        precedence: For binary operators, how tightly the operator binds.
+            Higher precedences bind more tightly.
+        left_associative: For binary operators, whether a chain of the
+            operator should be grouped from the left.
+        token: The string representing the operator in equations.
+        symbol: The name of the operator's token. Relations and functions
+            always use their name.
+        source: Template of the Python source for the operator, used when
+            compiling trees. Arguments are substituted for {0}, {1}, etc.
+        code: A small integer identifying the operator, assigned when it
+            is registered. Nodes store it, so that the operator of a node
+            can be found without comparing functions.
+        derivative: Function applying the operator to the Dual numbers
+            of its arguments, or None if it can't be differentiated.
+    """
+    def __init__(self, name, kind, scalar, vector=None, precedence=None,
+                 left_associative=False, token=None, symbol=None,
+                 source=None, derivative=None):
+        """Create a new operator.
+
+        Args:
+            name: See Operator.name.
+            kind: See Operator.kind.
+            scalar: See Operator.scalar.
+            vector: See Operator.vector.
+            precedence: See Operator.precedence.
+            left_associative: See Operator.left_associative.
+            token: See Operator.token. Defaults to the name in lower case.
+            symbol: See Operator.symbol.
+            source: See Operator.source. Defaults to a call of the
+                scalar (or vector) function.
+            derivative: See Operator.derivative.
+        """
+        self.name = name
+        self.kind = kind
+        if kind in [OPERATOR_RELATION, OPERATOR_BINARY, OPERATOR_CONJUNCTION]:
+            self.arity = 2
+        else:
+            self.arity = 1
+        self.scalar = scalar
+        self.vector = vector
+        self.precedence = precedence
+        self.left_associative = left_associative
+        self.token = token or name.lower()
+        if kind in [OPERATOR_RELATION, OPERATOR_FUNCTION]:
+            self.symbol = name
+        else:
+            self.symbol = symbol or name
+        self.source = source or "%s(%s)" % (
+            name, ", ".join("{%d}" % i for i in range(self.arity)))
+        self.code = None
+        self.derivative = derivative
+
+
+# The registry of operators, by name, in order of registration.
+OPERATORS = {}
+
+# Tables derived from the registry by update_tables().
+TOKENS = {}
+CODE = {}
+# Reverse lookup from the functions stored in nodes to their names.
+CODE_NAMES = {}
+# Lookup from the functions stored in nodes to their operator codes.
+OPCODES = {}
+# The registered operators, indexed by their codes.
+OPERATORS_BY_CODE = []
+FUNCTIONS = []
+GRAMMAR = {}
+# Maps each rule and terminal in GRAMMAR to the tokens it can start with.
+FIRST = {}
+LEFT_ASSOCIATIVE = []
+
+# Descriptions of tokens without a literal string, for error messages.
+TOKEN_DESCRIPTIONS = {"NUM": "a number", "VAR": "a variable"}
+
+
+Token = namedtuple("Token", ["name", "value", "position"])
+Match = namedtuple("Match", ["rule", "matched", "start", "end"])
+
+
+class TokenizeError(Exception):
+    """Raised when an input string contains unrecognised characters.
+
+    Attributes:
+        unrecognized: A list of (position, character) tuples.
+    """
+
+    def __init__(self, unrecognized):
+        """Create the error.
+
+        Args:
+            unrecognized: See TokenizeError.unrecognized.
+        """
+        super(TokenizeError, self).__init__(
+            "Unrecognised characters: " + ", ".join(
+                "{!r} at {}".format(c, i) for i, c in unrecognized))
+        self.unrecognized = unrecognized
+
+
+class ParseError(Exception):
+    """Raised when the tokens of an input string don't fit the grammar.
+
+    Attributes:
+        position: The index of the token where parsing failed.
+        column: The index of the character where parsing failed.
+        expected: A sorted list of the names of tokens which would have
+            allowed parsing to continue.
+        found: The Token found instead, or None at the end of the input.
+    """
+
+    def __init__(self, tokens, position, expected, message=None):
+        """Create the error.
+
+        Args:
+            tokens: The tuple of tokens being parsed.
+            position: See ParseError.position.
+            expected: See ParseError.expected. Any iterable.
+            message: Optional description of the error. By default, the
+                expected tokens are listed.
+        """
+        self.position = position
+        self.expected = sorted(expected)
+        if position < len(tokens):
+            self.found = tokens[position]
+            self.column = self.found.position
+            found = '"%s"' % self.found.value
+        else:
+            self.found = None
+            self.column = 0
+            if tokens:
+                self.column = tokens[-1].position + len(tokens[-1].value)
+            found = "the end"
+        if not message:
+            message = "Expected %s" % " or ".join(
+                sorted(set(map(describe_token, self.expected)))
+                or ["nothing"])
+        super(ParseError, self).__init__(
+            "%s at column %d, but found %s." % (message, self.column, found))
+
+
+def describe_token(name):
+    """Describe a token by name, for error messages."""
+    if name in TOKEN_DESCRIPTIONS:
+        return TOKEN_DESCRIPTIONS[name]
+    for literal, token in TOKENS.items():
+        if token == name:
+            return '"%s"' % literal
+    return name
+
+
+def compile_tokenizer(tokens):
+    """Build a regex which splits an input string into tokens.
+
+    Each alternative is a named group, so the name of the group which
+    matched is the name of the token. Longer literal tokens are tried
+    first so that, for example, "<=" is not read as "<" then "=".
+
+    Args:
+        tokens: A dict mapping literal token strings to token names.
+
+    Returns:
+        A compiled regex object.
+    """
+    literals = sorted(tokens, key=len, reverse=True)
+    groups = ["(?P<%s>%s)" % (tokens[t], re.escape(t)) for t in literals]
+    groups.append(r"(?P<VAR>[a-z])")
+    groups.append(r"(?P<NUM>[\d.]+j?)")
+    groups.append(r"(?P<SKIP>\s+)")
+    groups.append(r"(?P<MISMATCH>.)")
+    return re.compile("|".join(groups))
+
+
+TOKENIZER = None
+
+
+def tokenize(equation):
+    """Split an input string into a tuple of tokens.
+
+    Whitespace is skipped.
+
+    Args:
+        equation: The input string.
+
+    Returns:
+        A tuple of Token tuples.
+
+    Raises:
+        TokenizeError: The input contains unrecognised characters.
+    """
+    tokens = []
+    unrecognized = []
+    for match in TOKENIZER.finditer(equation):
+        name = match.lastgroup
+        if name == "MISMATCH":
+            unrecognized.append((match.start(), match.group()))
+        elif name != "SKIP":
+            tokens.append(Token(name, match.group(), match.start()))
+    if unrecognized:
+        raise TokenizeError(unrecognized)
+    return tuple(tokens)
+
+
+def build_grammar(operators):
+    """Build the grammar for a set of operators.
+
+    Binary operators each get their own rule, chained in order of
+    precedence. Every rule is right-recursive, so chains of left
+    associative operators are fixed after matching.
+
+    Args:
+        operators: An iterable of Operator objects.
+
+    Returns:
+        A dict mapping rules to lists of cases.
+    """
+    operators = list(operators)
+    kinds = {}
+    for op in operators:
+        kinds.setdefault(op.kind, []).append(op)
+    binary = sorted(
+        kinds.get(OPERATOR_BINARY, []), key=lambda op: op.precedence)
+    levels = [op.name for op in binary] + ["atm"]
+    top = levels[0]
+
+    grammar = {
+        # Two relations can be chained, as in a < b < c.
+        "eqn": [
+            "%s rel %s rel %s" % (top, top, top),
+            "%s rel %s" % (top, top)],
+        "rel": [op.symbol for op in kinds.get(OPERATOR_RELATION, [])]
+    }
+    for op, next_level in zip(binary, levels[1:]):
+        grammar[op.name] = [
+            "%s %s %s" % (next_level, op.symbol, op.name),
+            next_level]
+    grammar["atm"] = ["NUM", "VAR", "par"]
+    grammar["par"] = ["LPAR %s RPAR" % top]
+    for op in operators:
+        if op.kind == OPERATOR_BRACKET:
+            grammar["atm"].append(op.name)
+            grammar[op.name] = [
+                "%s %s %s" % (op.symbol, top, op.symbol)]
+        elif op.kind == OPERATOR_PREFIX:
+            grammar["atm"].append(op.name)
+            grammar[op.name] = ["%s atm" % op.symbol]
+    grammar["atm"].append("fun")
+    grammar["fun"] = [
+        "%s atm" % op.symbol for op in kinds.get(OPERATOR_FUNCTION, [])]
+    return grammar
+
+
+def first_sets(ruleset):
+    """Find the tokens which each rule in a ruleset can start with.
+
+    No rule can match an empty list of tokens, so each case starts with
+    the tokens its first subrule can start with.
+
+    Args:
+        ruleset: A dict mapping rules to lists of cases.
+
+    Returns:
+        A dict mapping every rule and terminal in the ruleset to a
+        frozenset of token names.
+    """
+    starts = {rule: [case.split()[0] for case in cases]
+              for rule, cases in ruleset.items()}
+    first = {rule: set() for rule in ruleset}
+    for subrules in starts.values():
+        for subrule in subrules:
+            if subrule not in ruleset:
+                first[subrule] = {subrule}
+    # Repeat until no set grows.
+    changed = True
+    while changed:
+        changed = False
+        for rule, subrules in starts.items():
+            for subrule in subrules:
+                if not first[subrule] <= first[rule]:
+                    first[rule] |= first[subrule]
+                    changed = True
+    return {symbol: frozenset(names) for symbol, names in first.items()}
+
+
+def update_tables():
+    """Rebuild the tables derived from the operator registry.
+
+    The tables are updated in place, since they are used as defaults.
+    """
+    global TOKENIZER
+
+    tokens = {"(": "LPAR", ")": "RPAR"}
+    for op in OPERATORS.values():
+        if op.kind != OPERATOR_CONJUNCTION:
+            tokens[op.token] = op.symbol
+    TOKENS.clear()
+    TOKENS.update(tokens)
+
+    CODE.clear()
+    CODE.update((op.name, op.scalar) for op in OPERATORS.values())
+    CODE_NAMES.clear()
+    CODE_NAMES.update((op.scalar, op.name) for op in OPERATORS.values())
+    OPCODES.clear()
+    OPCODES.update((op.scalar, op.code) for op in OPERATORS.values())
+    OPERATORS_BY_CODE[:] = sorted(OPERATORS.values(), key=lambda op: op.code)
+
+    FUNCTIONS[:] = [
+        op.symbol for op in OPERATORS.values()
+        if op.kind == OPERATOR_FUNCTION]
+    LEFT_ASSOCIATIVE[:] = [
+        op.name for op in OPERATORS.values() if op.left_associative]
+
+    GRAMMAR.clear()
+    GRAMMAR.update(build_grammar(OPERATORS.values()))
+    FIRST.clear()
+    FIRST.update(first_sets(GRAMMAR))
+    TOKENIZER = compile_tokenizer(TOKENS)
+
+
+def register_operator(*operators):
+    """Add operators to the registry, replacing any with the same names.
+
+    Replacements keep the code of the operator they replace.
+
+    Args:
+        operators: The Operator objects to add.
+    """
+    for op in operators:
+        if op.name in OPERATORS:
+            op.code = OPERATORS[op.name].code
+        else:
+            op.code = len(OPERATORS)
+        OPERATORS[op.name] = op
+    update_tables()
+
+
+def array_function(name, complex_argument=False):
+    """Look up a NumPy function for use as a vectorized implementation.
+
+    Args:
+        name: The name of the function in the numpy module.
+        complex_argument: Whether to make the first argument complex,
+            so that (like cmath) the square root of a negative real
+            is imaginary rather than NaN.
+
+    Returns:
+        The function, or None if NumPy is not installed.
+    """
+    if not numpy:
+        return None
+    function = getattr(numpy, name)
+    if complex_argument:
+        return lambda x, *args: function(numpy.asarray(x, complex), *args)
+    return function
+
+
+register_operator(
+    Operator("MORE", OPERATOR_RELATION,
+        lambda x, y: x.real > y.real,
+        lambda x, y: numpy.real(x) > numpy.real(y),
+        token=">", source="{0}.real > {1}.real",
+        derivative=inequality_derivative),
+    Operator("MEQL", OPERATOR_RELATION,
+        lambda x, y: x.real >= y.real,
+        lambda x, y: numpy.real(x) >= numpy.real(y),
+        token=">=", source="{0}.real >= {1}.real",
+        derivative=inequality_derivative),
+    Operator("EQL", OPERATOR_RELATION,
+        operator.eq, array_function("equal"),
+        token="=", source="{0} == {1}",
+        derivative=equality_derivative),
+    Operator("LEQL", OPERATOR_RELATION,
+        lambda x, y: x.real <= y.real,
+        lambda x, y: numpy.real(x) <= numpy.real(y),
+        token="<=", source="{0}.real <= {1}.real",
+        derivative=inequality_derivative),
+    Operator("LESS", OPERATOR_RELATION,
+        lambda x, y: x.real < y.real,
+        lambda x, y: numpy.real(x) < numpy.real(y),
+        token="<", source="{0}.real < {1}.real",
+        derivative=inequality_derivative),
+    Operator("add", OPERATOR_BINARY,
+        operator.add, array_function("add"), precedence=1,
+        token="+", symbol="ADD", source="{0} + {1}",
+        derivative=add_derivative),
+    Operator("sub", OPERATOR_BINARY,
+        operator.sub, array_function("subtract"), precedence=2,
+        left_associative=True,
+        token="-", symbol="SUB", source="{0} - {1}",
+        derivative=sub_derivative),
+    Operator("mul", OPERATOR_BINARY,
+        operator.mul, array_function("multiply"), precedence=3,
+        token="*", symbol="MUL", source="{0} * {1}",
+        derivative=mul_derivative),
+    Operator("div", OPERATOR_BINARY,
+        operator.truediv, array_function("true_divide"), precedence=4,
+        left_associative=True,
+        token="/", symbol="DIV", source="{0} / {1}",
+        derivative=div_derivative),
+    Operator("exp", OPERATOR_BINARY,
+        operator.pow, array_function("power", True), precedence=5,
+        token="^", symbol="EXP",
+        derivative=pow_derivative),
+    Operator("mod", OPERATOR_BRACKET,
+        abs, array_function("abs"),
+        token="|", symbol="MOD", source="abs({0})",
+        derivative=mod_derivative),
+    Operator("neg", OPERATOR_PREFIX,
+        operator.neg, array_function("negative"),
+        token="-", symbol="SUB", source="-{0}",
+        derivative=neg_derivative),
+    Operator("pos", OPERATOR_PREFIX,
+        operator.pos, array_function("positive"),
+        token="+", symbol="ADD", source="{0}",
+        derivative=pos_derivative),
+    Operator("SIN", OPERATOR_FUNCTION,
+        cmath.sin, array_function("sin", True),
+        derivative=sin_derivative),
+    Operator("COS", OPERATOR_FUNCTION,
+        cmath.cos, array_function("cos", True),
+        derivative=cos_derivative),
+    Operator("TAN", OPERATOR_FUNCTION,
+        cmath.tan, array_function("tan", True),
+        derivative=tan_derivative),
+    Operator("SQRT", OPERATOR_FUNCTION,
+        cmath.sqrt, array_function("sqrt", True),
+        derivative=sqrt_derivative),
+    Operator("ARG", OPERATOR_FUNCTION,
+        cmath.phase, array_function("angle"),
+        derivative=arg_derivative),
+    Operator("AND", OPERATOR_CONJUNCTION,
+        lambda x, y: x and y, array_function("logical_and"))
+)
 
 
 NODE_TYPE_NUM = 0
 NODE_TYPE_VAR = 1
 NODE_TYPE_OP = 2
 
+ENGINE_PACKRAT = "packrat"
+ENGINE_PRATT = "pratt"
+
 
 class Node:
     """A node used to build an AST.
@@ -91,6 +495,10 @@ class Node:
         value: The value stored in the node.
         children: A list of child node objects.
         parent: A reference to the node's parent, if one exists.
+        code: The code of the node's operator, or None if the node isn't
+            an operator node or its function isn't a registered operator.
+        compiled: Cache of functions returned by Node.compile, and of the
+            function used by Node.differentiate.
     """
 
     def __init__(self, type, value, *children):
@@ -105,6 +513,10 @@ class Node:
         self.value = value
         self.children = children
         self.parent = None
+        self.code = None
+        if type == NODE_TYPE_OP:
+            self.code = OPCODES.get(value)
+        self.compiled = {}
         for child in self.children:
             child.parent = self
 
@@ -120,6 +532,46 @@ class Node:
         else:
             return self.value
 
+    def compile(self, vectorized=False):
+        """Compile the tree up to this node into a Python function.
+
+        The function is generated once and cached on the node.
+
+        Args:
+            vectorized: Whether the function should operate on NumPy
+                arrays rather than single values.
+
+        Returns:
+            A function taking a single value, which is substituted for
+            every variable in the tree.
+        """
+        if vectorized not in self.compiled:
+            self.compiled[vectorized] = compile_tree(self, vectorized)
+        return self.compiled[vectorized]
+
+    def differentiate(self, z):
+        """Evaluate the tree up to this node, with its partial derivatives.
+
+        The tree is compiled by compile_derivative the first time this
+        is called.
+
+        Args:
+            z: The value to substitute for every variable.
+
+        Returns:
+            A Dual holding the value of the tree, and its partial
+            derivatives with respect to the real and imaginary parts of
+            the variable.
+
+        Raises:
+            ValueError: The tree contains an operator with no derivative,
+                or isn't differentiable at z.
+            ZeroDivisionError: The tree isn't differentiable at z.
+        """
+        if "derivative" not in self.compiled:
+            self.compiled["derivative"] = compile_derivative(self)
+        return self.compiled["derivative"](z)
+
     def __repr__(self):
         """Represent the node as a string.
         
@@ -139,24 +591,79 @@ class SyntaxParser:
         equation: The input string to parse.
         ruleset: A set of grammatical rules to match against the string.
         root: The rule in the ruleset to start searching for.
+        engine: ENGINE_PACKRAT to match the tokens against the ruleset,
+            or ENGINE_PRATT to parse them with a PrattParser, which
+            builds the same trees from the operator registry in a single
+            pass. The Pratt engine ignores the ruleset and memo options.
+        memoize: Whether to use packrat parsing, which remembers the result
+            of matching each rule at each token position. Without this,
+            backtracking makes parsing exponential in the nesting depth.
+        memo: Maps (rule, position) to the result of matching, the end
+            of the range of tokens examined to find the result, and the
+            furthest failure while matching, as a (position, expected)
+            tuple. Failures are replayed when an entry is re-used, so
+            errors are the same whether or not the memo was re-used.
+        incremental: Whether to keep the memo between parses, so that
+            SyntaxParser.update only re-matches the edited region.
+        exact: Whether numbers in the tree should be ExactComplex objects,
+            which are rational, rather than complex floats.
+        examined: The end of the range of tokens examined so far while
+            matching the current rule.
+        cases: The ruleset, with each case pre-split into subrules.
+        first: Maps each rule and terminal to the tokens it can start
+            with. Cases which can't start with the next token are
+            skipped without being matched.
+        furthest: The index of the furthest token at which matching
+            failed during the last parse.
+        expected: The names of the tokens which would have allowed
+            matching to continue at the furthest failure.
+        tokens: An immutable tuple of the tokens being parsed.
+        match_count: The number of Match tuples created by the last parse.
+            With memoization this is bounded by the number of rules and
+            terminals multiplied by the number of token positions.
         tree: When parsed, stores the root node of the AST.
         parsed: Whether the input has been successfully parsed.
+        error: When parsing fails, the ParseError or TokenizeError
+            describing why. Otherwise None.
     """
 
-    def __init__(self, equation, root="eqn", ruleset=GRAMMAR):
+    def __init__(self, equation, root="eqn", ruleset=GRAMMAR, memoize=True,
+                 incremental=False, engine=ENGINE_PACKRAT, exact=False):
         """Create new parser with input string and options.
 
         Args:
             equation: See SyntaxParser.equation.
             root: See SyntaxParser.root.
             ruleset: See SyntaxParser.ruleset.
+            engine: See SyntaxParser.engine.
+            exact: See SyntaxParser.exact.
+            memoize: See SyntaxParser.memoize.
+            incremental: See SyntaxParser.incremental. Implies memoize.
         """
         super(SyntaxParser, self).__init__()
         self.equation = equation
         self.ruleset = ruleset
         self.root = root
+        self.engine = engine
+        self.memoize = memoize or incremental
+        self.incremental = incremental
+        self.exact = exact
+        self.memo = {}
+        self.examined = 0
+        self.cases = {
+            rule: [case.split() for case in cases]
+            for rule, cases in ruleset.items()}
+        if ruleset is GRAMMAR:
+            self.first = FIRST
+        else:
+            self.first = first_sets(ruleset)
+        self.furthest = -1
+        self.expected = set()
+        self.tokens = ()
+        self.match_count = 0
         self.tree = None
         self.parsed = False
+        self.error = None
 
     def get_tree(self):
         """Get the root node of the AST.
@@ -170,70 +677,242 @@ class SyntaxParser:
             self.tree = self.parse()
         return self.tree
 
-    def parse(self):
-        """Attempt to parse the input string.
+    def update(self, equation):
+        """Parse a new input string, typically an edit of the last one.
+
+        In incremental mode, matches which only depend on the tokens
+        before or after the edited region are re-used.
+
+        Args:
+            equation: The new input string.
 
         Returns:
             The root node of the AST.
+        """
+        self.equation = equation
+        self.parsed = False
+        return self.get_tree()
 
-        Raises:
-            Exception: The input string is not valid.
+    def parse(self):
+        """Attempt to parse the input string.
+
+        Returns:
+            The root node of the AST, or None if the input string is not
+            valid. SyntaxParser.error then describes the problem.
         """
+        self.error = None
         try:
-            # Alter the tokens to play nicely with regex.
-            regex_tokens = list(TOKENS)
-            for t in ["<", "<=", "=", ">=", ">"]: regex_tokens.remove(t)
-            escape = re.compile(
-                r"[\-\[\]\/\{\}\(\)\*\+\?\.\\\^\$\|]", re.IGNORECASE)
-            for i in range(len(regex_tokens)):
-                regex_tokens[i] = escape.sub(r"\\\g<0>", regex_tokens[i])
-            regex_tokens.append(r"[<>]?=")
-            regex_tokens.append(r"[<>]")
-
-            # Get list of tokens from regex.
-            split = re.findall(
-                r"%s|[a-ik-z]|[\d.]*j|[\d.]+" % r"|".join(regex_tokens),
-                self.equation)
-            tokens = [
-                Token(TOKENS.get(x, "VAR" if x.isalpha() else "NUM"), x)
-                for x in split]
+            tokens = tokenize(self.equation)
+            if self.engine == ENGINE_PRATT:
+                self.tokens = tokens
+                self.match_count = 0
+                parser = PrattParser(tokens, self.exact)
+                return simplify(parser.parse(self.root))
+            if self.incremental:
+                self.memo = self.reuse_memo(tokens)
+            else:
+                self.memo = {}
+            self.tokens = tokens
 
             # Attempt to match the tokens to the grammar.
-            match, remaining = self.match(self.root, tokens)
-            if match and len(remaining) == 0:
+            match, end = self.match_all()
+            if match and end == len(self.tokens):
                 # Fix associativity issues caused by left recursion.
                 match = self.fix_associativity(match)
-                # Build and return the tree.
-                return self.build(match)
-            else:
-                raise Exception("Tokens invalid for grammar.")
-        except:
-            pass
+                # Build, simplify and return the tree.
+                return simplify(self.build(match))
+            if match and end > self.furthest:
+                self.check_numbers(end)
+                raise ParseError(self.tokens, end, [], "Expected the end")
+            self.check_numbers(self.furthest)
+            raise ParseError(self.tokens, self.furthest, self.expected)
+        except Exception as error:
+            self.error = error
         finally:
+            if not self.incremental:
+                # The memo is only valid for one token list.
+                self.memo = {}
             self.parsed = True
 
-    def match(self, rule, tokens):
-        """Attempt to match a set of tokens to a rule.
+    def check_numbers(self, end):
+        """Check the numbers before the point where matching stopped.
+
+        Invalid numbers are only found when the tree is built, but the
+        Pratt engine finds them as it reads them. Checking the numbers
+        which were read before a syntax error makes both engines report
+        the same error.
+
+        Args:
+            end: The index of the token where matching stopped.
+
+        Raises:
+            ParseError: There is an invalid number before end.
+        """
+        for position, token in enumerate(self.tokens[:end]):
+            if token.name == "NUM":
+                try:
+                    parse_number(token.value, self.exact)
+                except ValueError:
+                    raise ParseError(
+                        self.tokens, position, [], "Invalid number")
+
+    def match_all(self):
+        """Match the tokens to the root rule, recording failures.
+
+        Returns:
+            A Match tuple (or None) and the index of the first token
+            after the match.
+        """
+        self.examined = 0
+        self.match_count = 0
+        self.furthest = -1
+        self.expected = set()
+        return self.match(self.root, 0)
+
+    def fail(self, position, expected):
+        """Record a failure to match, if it is the furthest so far.
+
+        Args:
+            position: The index of the token which didn't match.
+            expected: The names of the tokens which would have matched.
+        """
+        if position > self.furthest:
+            self.furthest = position
+            self.expected = set(expected)
+        elif position == self.furthest:
+            self.expected.update(expected)
+
+    def reuse_memo(self, tokens):
+        """Find the memo entries which are still valid for new tokens.
+
+        The new tokens are compared with the old ones, to find the
+        unchanged prefix and suffix. Entries which only examined tokens
+        in the prefix are kept. Entries starting in the suffix are kept,
+        but moved to their new positions.
+
+        Args:
+            tokens: The new tuple of tokens.
+
+        Returns:
+            A new memo.
+        """
+        old = self.tokens
+        length = min(len(old), len(tokens))
+        prefix = 0
+        while prefix < length \
+        and old[prefix][:2] == tokens[prefix][:2]:
+            prefix += 1
+        suffix = 0
+        while suffix < length - prefix \
+        and old[-1 - suffix][:2] == tokens[-1 - suffix][:2]:
+            suffix += 1
+        delta = len(tokens) - len(old)
+        suffix_start = len(old) - suffix
+
+        shifted = {}
+
+        def shift(match):
+            """Move a match (and its children) to its new position."""
+            if id(match) not in shifted:
+                matched = match.matched
+                if isinstance(matched, list):
+                    matched = [shift(child) for child in matched]
+                shifted[id(match)] = Match(
+                    match.rule, matched,
+                    match.start + delta, match.end + delta)
+            return shifted[id(match)]
+
+        memo = {}
+        for (rule, position), entry in self.memo.items():
+            (match, end), examined, (furthest, expected) = entry
+            if examined <= prefix:
+                memo[rule, position] = entry
+            elif position >= suffix_start:
+                if match:
+                    match = shift(match)
+                if furthest >= 0:
+                    furthest += delta
+                memo[rule, position + delta] = (
+                    (match, end + delta), examined + delta,
+                    (furthest, expected))
+        return memo
+
+    def match(self, rule, position):
+        """Attempt to match the tokens at a position to a rule.
+
+        If memoization is enabled, each rule is only matched once at
+        each position, which makes parsing linear in the token count.
 
         Args:
             rule: A key in the ruleset to match against.
-            tokens: The list of remaining tokens.
+            position: The index of the first token to match.
 
         Returns:
-            A Match tuple and the remaining unmatched tokens.
+            A Match tuple (or None) and the index of the first token
+            after the match.
         """
-        if tokens and rule == tokens[0].name:
-            return Match(*tokens[0]), tokens[1:]
-        for case in self.ruleset.get(rule, ()):
-            remaining = tokens
+        if not self.memoize:
+            return self.match_rule(rule, position)
+        key = (rule, position)
+        entry = self.memo.get(key)
+        if entry is None:
+            # Track the tokens examined and failures by this rule alone.
+            outer = (self.examined, self.furthest, self.expected)
+            self.examined = position
+            self.furthest = -1
+            self.expected = set()
+            result = self.match_rule(rule, position)
+            entry = self.memo[key] = (
+                result, self.examined, (self.furthest, self.expected))
+            self.examined, self.furthest, self.expected = outer
+        self.examined = max(self.examined, entry[1])
+        furthest, expected = entry[2]
+        if furthest >= self.furthest:
+            self.fail(furthest, expected)
+        return entry[0]
+
+    def match_rule(self, rule, position):
+        """Match the tokens at a position to a rule, ignoring the memo.
+
+        Args:
+            rule: A key in the ruleset to match against.
+            position: The index of the first token to match.
+
+        Returns:
+            A Match tuple (or None) and the index of the first token
+            after the match.
+        """
+        tokens = self.tokens
+        # Every rule depends on at least the next token.
+        self.examined = max(self.examined, position + 1)
+        if position < len(tokens):
+            name = tokens[position].name
+        else:
+            name = None
+        if rule not in self.cases:
+            # Terminal rules match a single token.
+            if rule == name:
+                self.match_count += 1
+                return Match(rule, tokens[position].value, position,
+                    position + 1), position + 1
+            self.fail(position, [rule])
+            return None, position
+        for case in self.cases[rule]:
+            first = self.first[case[0]]
+            if name not in first:
+                # The case can't match, so skip straight to the next.
+                self.fail(position, first)
+                continue
+            end = position
             chain = []
-            for subrule in case.split():
-                matched, remaining = self.match(subrule, remaining)
+            for subrule in case:
+                matched, end = self.match(subrule, end)
                 if not matched: break
                 chain.append(matched)
             else:
-                return Match(rule, chain), remaining
-        return None, []
+                self.match_count += 1
+                return Match(rule, chain, position, end), end
+        return None, position
 
     def fix_associativity(self, match, rules=LEFT_ASSOCIATIVE):
         """Reverse associativity on certain binary operators.
@@ -256,14 +935,16 @@ class SyntaxParser:
             and len(matched) == 3  \
             and match.rule == matched[-1].rule:
                 matched[-1:] = matched[-1].matched
-            return Match(match.rule, matched)
+            return Match(match.rule, matched, match.start, match.end)
 
         def build_left(match):
             matched = recurse(match, build_left)
             if match.rule in rules:
                 while len(matched) > 3:
-                    matched[:3] = [Match(match.rule, matched[:3])]
-            return Match(match.rule, matched)
+                    matched[:3] = [Match(
+                        match.rule, matched[:3],
+                        matched[0].start, matched[2].end)]
+            return Match(match.rule, matched, match.start, match.end)
 
         return build_left(flatten(match))
 
@@ -276,15 +957,22 @@ class SyntaxParser:
         Returns:
             The root node of the built AST.
         """
-        # Create an alias for the child matches, and
-        # force it to be a list.
+        # Copy the child matches, forcing them to be a list. Matches
+        # may be shared through the memo, so must not be modified.
         matched = match.matched
-        if not isinstance(matched, list):
+        if isinstance(matched, list):
+            matched = list(matched)
+        else:
             matched = [matched]
 
         if match.rule == "NUM":
             # Create a leaf node containing the number.
-            return Node(NODE_TYPE_NUM, complex(matched[0]))
+            try:
+                value = parse_number(matched[0], self.exact)
+            except ValueError:
+                raise ParseError(
+                    self.tokens, match.start, [], "Invalid number")
+            return Node(NODE_TYPE_NUM, value)
         elif match.rule == "VAR":
             # Create a leaf node representing a variable.
             return Node(NODE_TYPE_VAR, matched[0])
@@ -299,37 +987,30 @@ class SyntaxParser:
             else:
                 i += 1
 
-        if match.rule in ["eqn", "fun"]:
+        if match.rule == "eqn":
             # We need a special case for relations (equations)
             # as we need to snoop further down the tree to find
-            # which type of relation to use.
-            # We need a special case for functions for the same
-            # reason, but the implementation is slightly different.
+            # which type of relation to use. The operands and
+            # relations alternate, since relations can be chained.
+            return chain_relations(
+                [self.build(child) for child in matched[::2]],
+                [OPERATORS[child.matched[0].rule] for child in matched[1::2]])
+        elif match.rule == "fun":
+            # We need a special case for functions for the same reason.
             operator = None
-            if match.rule == "eqn":
-                # This is a relation node.
-                for i in range(len(matched)):
-                    if matched[i].rule == "rel":
-                        # Find and use the correct relation.
-                        operator = matched[i].matched[0].rule
-                        del matched[i]
-                        break
-            elif match.rule == "fun":
-                # This is a function node.
-                for i in range(len(matched)):
-                    if matched[i].rule in FUNCTIONS:
-                        # Find and use the correct function.
-                        operator = matched[i].rule
-                        del matched[i]
-                        break
+            for i in range(len(matched)):
+                if matched[i].rule in FUNCTIONS:
+                    # Find and use the correct function.
+                    operator = matched[i].rule
+                    del matched[i]
+                    break
 
             # If we found an operator deeper in the tree, try to
             # create a node for it.
             if operator:
                 # We have a supported operator, but do we have
                 # the right number of arguments?
-                args = inspect.getargspec(CODE[operator])[0]
-                if len(matched) == len(args):
+                if len(matched) == OPERATORS[operator].arity:
                     # We have the correct number of arguments.
                     return Node(
                         NODE_TYPE_OP,
@@ -339,13 +1020,12 @@ class SyntaxParser:
                     raise Exception("Incorrect number of arguments.")
             else:
                 raise Exception("Operator not found where expected.")
-        elif match.rule in CODE:
+        elif match.rule in OPERATORS:
             # We have a general rule node. We need to determine
             # if it is being used as a container or operator.
             # Then, we check if the number of child matches left is
             # the same as the expected number of arguments for the func.
-            args = inspect.getargspec(CODE[match.rule])[0]
-            if len(matched) == len(args):
+            if len(matched) == OPERATORS[match.rule].arity:
                 # We have an operator node.
                 return Node(
                     NODE_TYPE_OP,
@@ -359,6 +1039,203 @@ class SyntaxParser:
             return self.build(matched[0])
 
 
+class PrattParser:
+    """Parses a tuple of tokens to an AST by precedence climbing.
+
+    Chains of binary operators are parsed in a loop, rather than by
+    recursing through a grammar rule for each precedence level, so
+    operators are grouped with the correct associativity as the tree
+    is built. The trees are the same as those built by matching the
+    tokens against GRAMMAR: prefix operators and functions apply to a
+    single atom, and at most two relations are chained.
+
+    Attributes:
+        tokens: The tuple of tokens to parse.
+        exact: Whether numbers should be ExactComplex objects.
+        position: The index of the next token to parse.
+        chain_length: The number of relations parsed so far.
+        operators: Maps each OPERATOR_* kind to a dict of the registered
+            operators of that kind, by token name.
+    """
+
+    def __init__(self, tokens, exact=False):
+        """Create a new parser for a tuple of tokens.
+
+        Args:
+            tokens: See PrattParser.tokens.
+            exact: See PrattParser.exact.
+        """
+        self.tokens = tokens
+        self.exact = exact
+        self.position = 0
+        self.chain_length = 0
+        self.operators = {}
+        for op in OPERATORS.values():
+            self.operators.setdefault(op.kind, {})[op.symbol] = op
+
+    def parse(self, root="eqn"):
+        """Parse all of the tokens.
+
+        Args:
+            root: The grammar rule the tokens should form. Either "eqn",
+                "atm", or the name of a binary operator.
+
+        Returns:
+            The root node of the AST.
+
+        Raises:
+            ParseError: The tokens are not valid.
+        """
+        self.position = 0
+        if root == "eqn":
+            tree = self.parse_relation()
+        elif root == "atm":
+            tree = self.parse_atom()
+        else:
+            tree = self.parse_expression(OPERATORS[root].precedence)
+        if self.position != len(self.tokens):
+            expected = set()
+            if root != "atm":
+                expected.update(self.operators.get(OPERATOR_BINARY, {}))
+            if root == "eqn" and self.chain_length < 2:
+                expected.update(self.operators.get(OPERATOR_RELATION, {}))
+            self.fail(expected)
+        return tree
+
+    def peek(self):
+        """Get the name of the next token, or None at the end."""
+        if self.position < len(self.tokens):
+            return self.tokens[self.position].name
+        return None
+
+    def expect(self, name):
+        """Skip the next token, which must have the given name."""
+        if self.peek() != name:
+            # A binary operator could also have continued the bracket.
+            self.fail({name}.union(self.operators.get(OPERATOR_BINARY, {})))
+        self.position += 1
+
+    def fail(self, expected, message=None):
+        """Raise a ParseError at the next token."""
+        raise ParseError(self.tokens, self.position, expected, message)
+
+    def parse_relation(self):
+        """Parse expressions joined by one relation, or a chain of two."""
+        relations = self.operators.get(OPERATOR_RELATION, {})
+        operands = [self.parse_expression()]
+        chain = []
+        self.chain_length = 0
+        while self.peek() in relations and len(chain) < 2:
+            chain.append(relations[self.peek()])
+            self.chain_length = len(chain)
+            self.position += 1
+            operands.append(self.parse_expression())
+        if not chain:
+            self.fail(set(relations).union(
+                self.operators.get(OPERATOR_BINARY, {})))
+        return chain_relations(operands, chain)
+
+    def parse_expression(self, precedence=None):
+        """Parse a chain of binary operators.
+
+        Args:
+            precedence: The lowest precedence of operator to include in
+                the chain. Defaults to including every operator.
+
+        Returns:
+            The root node of the chain.
+        """
+        binary = self.operators.get(OPERATOR_BINARY, {})
+        left = self.parse_atom()
+        while self.peek() in binary:
+            op = binary[self.peek()]
+            if precedence is not None and op.precedence < precedence:
+                break
+            self.position += 1
+            # The right operand only includes operators of the same
+            # precedence if they should be grouped to the right.
+            if op.left_associative:
+                right = self.parse_expression(op.precedence + 1)
+            else:
+                right = self.parse_expression(op.precedence)
+            left = Node(NODE_TYPE_OP, op.scalar, left, right)
+        return left
+
+    def parse_atom(self):
+        """Parse a number, variable, bracketed expression or unary
+        operator applied to an atom."""
+        name = self.peek()
+        if name not in FIRST["atm"]:
+            self.fail(FIRST["atm"])
+        token = self.tokens[self.position]
+        if name == "NUM":
+            try:
+                value = parse_number(token.value, self.exact)
+            except ValueError:
+                self.fail([], "Invalid number")
+            self.position += 1
+            return Node(NODE_TYPE_NUM, value)
+        elif name == "VAR":
+            self.position += 1
+            return Node(NODE_TYPE_VAR, token.value)
+        elif name == "LPAR":
+            self.position += 1
+            tree = self.parse_expression()
+            self.expect("RPAR")
+            return tree
+        elif name in self.operators.get(OPERATOR_BRACKET, {}):
+            op = self.operators[OPERATOR_BRACKET][name]
+            self.position += 1
+            tree = self.parse_expression()
+            self.expect(name)
+            return Node(NODE_TYPE_OP, op.scalar, tree)
+        for kind in [OPERATOR_PREFIX, OPERATOR_FUNCTION]:
+            if name in self.operators.get(kind, {}):
+                op = self.operators[kind][name]
+                self.position += 1
+                return Node(NODE_TYPE_OP, op.scalar, self.parse_atom())
+        self.fail(FIRST["atm"])
+
+
+def parse_number(string, exact=False):
+    """Convert the value of a NUM token to a number.
+
+    Args:
+        string: The value of the token.
+        exact: Whether to return an ExactComplex rather than a complex.
+
+    Raises:
+        ValueError: The string is not a valid number.
+    """
+    if exact:
+        return ExactComplex.from_string(string)
+    return complex(string)
+
+
+def chain_relations(operands, relations):
+    """Build the node for a relation, or a chain such as a < b < c.
+
+    Each relation compares the operands either side of it, and the
+    relations are joined by conjunctions. Neighbouring relations share
+    the node of the operand between them.
+
+    Args:
+        operands: The nodes of the operands, in order.
+        relations: The Operator objects of the relations between them.
+
+    Returns:
+        The root node of the chain.
+    """
+    tree = None
+    for left, relation, right in zip(operands, relations, operands[1:]):
+        node = Node(NODE_TYPE_OP, relation.scalar, left, right)
+        if tree is None:
+            tree = node
+        else:
+            tree = Node(NODE_TYPE_OP, CODE["AND"], tree, node)
+    return tree
+
+
 def recurse(match, func):
     """Apply a function to all matched children in a Match tuple.
     
@@ -374,3 +1251,243 @@ def recurse(match, func):
         return list(map(func, match.matched))
     else:
         return match.matched
+
+
+def simplify(tree):
+    """Fold constant subtrees and normalize linear subtrees of an AST.
+
+    Every subtree without a variable (other than relations) is replaced
+    by a number node holding its value, unless evaluating it raises an
+    error. Every maximal subtree which is linear in the variable, such
+    as (z - 1) / 2, is rebuilt in the form a * z + b.
+
+    Args:
+        tree: The root node of the AST.
+
+    Returns:
+        The root node of the simplified AST. The original is unchanged,
+        although the new tree may share some of its nodes.
+    """
+    def linear(name, forms):
+        """Combine the linear forms of an operator's children.
+
+        Returns:
+            A (coefficient, offset) tuple, or None if not linear.
+        """
+        if None in forms:
+            return None
+        if name == "pos":
+            return forms[0]
+        if name == "neg":
+            return (-forms[0][0], -forms[0][1])
+        if name == "add":
+            (a0, a1), (b0, b1) = forms
+            return (a0 + b0, a1 + b1)
+        if name == "sub":
+            (a0, a1), (b0, b1) = forms
+            return (a0 - b0, a1 - b1)
+        if name == "mul":
+            # Only one side of a product may contain the variable.
+            (a0, a1), (b0, b1) = forms
+            if a0 == 0:
+                return (a1 * b0, a1 * b1)
+            if b0 == 0:
+                return (a0 * b1, a1 * b1)
+        if name == "div":
+            # Only the left side of a quotient may contain the variable.
+            (a0, a1), (b0, b1) = forms
+            if b0 == 0 and b1 != 0:
+                return (a0 / b1, a1 / b1)
+        return None
+
+    def rebuild(form, variable):
+        """Build a node representing coefficient * variable + offset."""
+        coefficient, offset = form
+        if coefficient == 0:
+            return Node(NODE_TYPE_NUM, offset)
+        node = Node(NODE_TYPE_VAR, variable)
+        if coefficient != 1:
+            node = Node(NODE_TYPE_OP, CODE["mul"],
+                Node(NODE_TYPE_NUM, coefficient), node)
+        if offset != 0:
+            node = Node(NODE_TYPE_OP, CODE["add"],
+                node, Node(NODE_TYPE_NUM, offset))
+        return node
+
+    def visit(node):
+        """Simplify the children of a node.
+
+        Returns:
+            The simplified node, the linear form of the node (or None)
+            and the name of a variable it contains (or None).
+        """
+        if node.type == NODE_TYPE_VAR:
+            return node, (1, 0), node.value
+        if node.type == NODE_TYPE_NUM:
+            return node, (0, node.value), None
+        results = [visit(child) for child in node.children]
+        children = [result[0] for result in results]
+        forms = [result[1] for result in results]
+        variables = [result[2] for result in results if result[2]]
+        name = CODE_NAMES.get(node.value)
+
+        form = linear(name, forms)
+        if form is None:
+            # This node ends any linear subtrees below it.
+            for i, (child, child_form, child_variable) in enumerate(results):
+                if child_form is not None and child.type == NODE_TYPE_OP:
+                    children[i] = rebuild(child_form, child_variable)
+        node = Node(node.type, node.value, *children)
+
+        relation = name in OPERATORS \
+            and OPERATORS[name].kind == OPERATOR_RELATION
+        if not relation and all(
+                child.type == NODE_TYPE_NUM for child in children):
+            try:
+                value = node.resolve()
+                return Node(NODE_TYPE_NUM, value), (0, value), None
+            except (ArithmeticError, ValueError):
+                # Leave the error to be raised when evaluated.
+                pass
+        return node, form, variables[0] if variables else None
+
+    root, form, variable = visit(tree)
+    if form is not None and root.type == NODE_TYPE_OP:
+        root = rebuild(form, variable)
+    return root
+
+
+def compile_tree(tree, vectorized=False):
+    """Compile an AST into a flat Python function of its variable.
+
+    Each operator node becomes one assignment to a temporary in the
+    generated source, so calling the function does not walk the tree
+    and deep trees do not hit the compiler's nesting limits.
+
+    Args:
+        tree: The root node of the AST.
+        vectorized: Whether to use the operators' vector functions.
+
+    Returns:
+        A function taking a single value, which is substituted for
+        every variable in the tree.
+
+    Raises:
+        ImportError: A vectorized function was requested without NumPy.
+    """
+    if vectorized and not numpy:
+        raise ImportError("NumPy is required for vectorized evaluation.")
+    namespace = {}
+    lines = []
+
+    def emit(node):
+        """Emit source for a node and return the name holding its value."""
+        if node.type == NODE_TYPE_VAR:
+            return "var"
+        if node.type == NODE_TYPE_NUM:
+            name = "c%d" % len(namespace)
+            # Exact numbers are evaluated as complex floats.
+            namespace[name] = complex(node.value)
+            if vectorized:
+                # NumPy scalars respect numpy.errstate, even when every
+                # operand of an operation is constant.
+                namespace[name] = numpy.complex128(namespace[name])
+            return name
+        args = [emit(child) for child in node.children]
+        name = CODE_NAMES.get(node.value)
+        if name in OPERATORS:
+            op = OPERATORS[name]
+            if vectorized:
+                namespace[name] = op.vector \
+                    or numpy.vectorize(op.scalar)
+            else:
+                namespace[name] = op.scalar
+            expression = op.source.format(*args)
+        else:
+            function = "f%d" % len(namespace)
+            namespace[function] = node.value
+            if vectorized:
+                namespace[function] = numpy.vectorize(node.value)
+            expression = "%s(%s)" % (function, ", ".join(args))
+        temp = "t%d" % len(lines)
+        lines.append("    %s = %s" % (temp, expression))
+        return temp
+
+    result = emit(tree)
+    lines.append("    return " + result)
+    source = "def evaluate(var):\n" + "\n".join(lines) + "\n"
+    exec(compile(source, "<tree>", "exec"), namespace)
+    return namespace["evaluate"]
+
+
+def compile_derivative(tree):
+    """Compile an AST into a flat Python function which evaluates it
+    with its partial derivatives, by forward-mode differentiation.
+
+    Like compile_tree, each operator node becomes one assignment, which
+    applies the operator's derivative rule to the Dual numbers of its
+    children.
+
+    Args:
+        tree: The root node of the AST.
+
+    Returns:
+        A function taking a single value, which is substituted for
+        every variable in the tree, and returning a Dual.
+
+    Raises:
+        ValueError: The tree contains an operator with no derivative.
+    """
+    namespace = {"Dual": Dual}
+    lines = ["    var = Dual.variable(z)"]
+
+    def emit(node):
+        """Emit source for a node and return the name holding its Dual."""
+        if node.type == NODE_TYPE_VAR:
+            return "var"
+        if node.type == NODE_TYPE_NUM:
+            name = "c%d" % len(namespace)
+            namespace[name] = Dual(complex(node.value))
+            return name
+        args = [emit(child) for child in node.children]
+        name = CODE_NAMES.get(node.value)
+        if name not in OPERATORS or not OPERATORS[name].derivative:
+            raise ValueError("%s can't be differentiated." % (name or "?"))
+        function = "d_" + name
+        namespace[function] = OPERATORS[name].derivative
+        temp = "t%d" % len(lines)
+        lines.append("    %s = %s(%s)" % (temp, function, ", ".join(args)))
+        return temp
+
+    result = emit(tree)
+    lines.append("    return " + result)
+    source = "def differentiate(z):\n" + "\n".join(lines) + "\n"
+    exec(compile(source, "<tree>", "exec"), namespace)
+    return namespace["differentiate"]
+
+
+def evaluate_array(tree, values):
+    """Evaluate an AST at many points at once.
+
+    Operations which are undefined at a point (such as division by
+    zero) give NaN there rather than raising an exception, so relations
+    are simply false at those points.
+
+    Args:
+        tree: The root node of the AST.
+        values: An array of complex values to substitute for the variable.
+
+    Returns:
+        A NumPy array with the same shape as values. For relations this
+        is a boolean array, which is true where the relation holds.
+
+    Raises:
+        ImportError: NumPy is not installed.
+    """
+    if not numpy:
+        raise ImportError("NumPy is required for vectorized evaluation.")
+    values = numpy.asarray(values, complex)
+    with numpy.errstate(all="ignore"):
+        result = tree.compile(True)(values)
+    # Trees without variables evaluate to a single value.
+    return numpy.broadcast_to(result, values.shape)
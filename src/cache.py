@@ -0,0 +1,327 @@
+"""Cache
+
+Bounded caches for reusing expensive results, in memory or on disk.
+
+Written by Sam Hubbard - samlhub@gmail.com
+Copyright (C) 2015 Sam Hubbard
+"""
+
+import hashlib
+import pickle
+import sqlite3
+from collections import OrderedDict
+
+
+DEFAULT_CACHE_SIZE = 256
+DEFAULT_DISK_CACHE_SIZE = 4096
+# SQLite limits the number of parameters in a single query.
+BATCH_SIZE = 500
+
+
+class LRUCache:
+    """A bounded mapping which evicts the least recently used entries.
+
+    Each entry has a weight, which is 1 unless given when it is added,
+    so by default the size is a number of entries. Weights can instead
+    be a measure of cost, such as the number of bytes an entry uses.
+
+    Attributes:
+        size: The maximum total weight of the entries to hold.
+        entries: Ordered dict of entries, least recently used first.
+        weights: Maps the key of each entry to its weight.
+        weight: The total weight of the entries.
+        hits: The number of lookups which found an entry.
+        misses: The number of lookups which didn't find an entry.
+    """
+    def __init__(self, size=DEFAULT_CACHE_SIZE):
+        """Create an empty cache.
+
+        Args:
+            size: See LRUCache.size.
+        """
+        self.size = size
+        self.entries = OrderedDict()
+        self.weights = {}
+        self.weight = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, default=None):
+        """Look up an entry, marking it as the most recently used.
+
+        Args:
+            key: The key of the entry.
+            default: The value to return if there is no entry.
+
+        Returns:
+            The value of the entry, or default.
+        """
+        try:
+            value = self.entries[key]
+        except KeyError:
+            self.misses += 1
+            return default
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def put(self, key, value, weight=1):
+        """Add or replace an entry, evicting old entries if necessary.
+
+        Args:
+            key: The key of the entry.
+            value: The value of the entry.
+            weight: The weight of the entry.
+        """
+        self.weight += weight - self.weights.get(key, 0)
+        self.weights[key] = weight
+        self.entries[key] = value
+        self.entries.move_to_end(key)
+        self.evict()
+
+    def discard(self, key):
+        """Remove an entry, if there is one."""
+        if key in self.entries:
+            del self.entries[key]
+            self.weight -= self.weights.pop(key)
+
+    def set_size(self, size):
+        """Change the maximum total weight of the entries.
+
+        Args:
+            size: See LRUCache.size.
+        """
+        self.size = size
+        self.evict()
+
+    def evict(self):
+        """Remove the least recently used entries until within size."""
+        while self.entries and self.weight > max(self.size, 0):
+            key, _ = self.entries.popitem(last=False)
+            self.weight -= self.weights.pop(key)
+
+    def clear(self):
+        """Remove all entries and reset the counters."""
+        self.entries.clear()
+        self.weights.clear()
+        self.weight = 0
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __contains__(self, key):
+        return key in self.entries
+
+
+class DiskCache:
+    """A bounded mapping stored in an SQLite database, which persists
+    between sessions.
+
+    Keys are strings, stored as their SHA-1 hash. Values are pickled.
+    Each entry is stored with a version string, and entries with any
+    other version are discarded when the database is opened, so
+    changing the version invalidates everything cached before.
+
+    If the database can't be opened or written, the cache behaves as
+    if it were empty rather than raising errors.
+
+    Attributes:
+        path: The path of the database file.
+        version: The version string of the current entries.
+        size: The maximum number of entries to hold. The least recently
+            used entries are evicted first.
+        connection: The sqlite3 connection, or None if the database
+            couldn't be opened.
+        clock: Counter recording the order in which entries are used.
+        hits: The number of lookups which found an entry.
+        misses: The number of lookups which didn't find an entry.
+    """
+    def __init__(self, path, version, size=DEFAULT_DISK_CACHE_SIZE):
+        """Open the database, creating it if necessary.
+
+        Args:
+            path: See DiskCache.path.
+            version: See DiskCache.version.
+            size: See DiskCache.size.
+        """
+        self.path = path
+        self.version = version
+        self.size = size
+        self.hits = 0
+        self.misses = 0
+        self.clock = 0
+        try:
+            self.connection = sqlite3.connect(path, timeout=1)
+            # Losing the last few entries in a power cut is harmless, so
+            # don't wait for every transaction to reach the disk.
+            self.connection.execute("PRAGMA journal_mode = WAL")
+            self.connection.execute("PRAGMA synchronous = NORMAL")
+            with self.connection:
+                self.connection.execute(
+                    "CREATE TABLE IF NOT EXISTS entries ("
+                    "key TEXT PRIMARY KEY, version TEXT, "
+                    "used INTEGER, value BLOB)")
+                self.connection.execute(
+                    "DELETE FROM entries WHERE version != ?", (version,))
+            self.clock = self.connection.execute(
+                "SELECT MAX(used) FROM entries").fetchone()[0] or 0
+        except sqlite3.Error:
+            self.connection = None
+
+    def get(self, key, default=None):
+        """Look up an entry, marking it as the most recently used.
+
+        Args:
+            key: The key of the entry.
+            default: The value to return if there is no entry.
+
+        Returns:
+            The value of the entry, or default.
+        """
+        return self.get_many([key]).get(key, default)
+
+    def get_many(self, keys):
+        """Look up a batch of entries in a single transaction.
+
+        Args:
+            keys: An iterable of keys.
+
+        Returns:
+            A dict mapping the keys which were found to their values.
+        """
+        keys = list(dict.fromkeys(keys))
+        found = {}
+        if self.connection is None:
+            self.misses += len(keys)
+            return found
+        hashes = {hash_key(key): key for key in keys}
+        digests = list(hashes)
+        try:
+            with self.connection:
+                for i in range(0, len(digests), BATCH_SIZE):
+                    batch = digests[i:i + BATCH_SIZE]
+                    rows = self.connection.execute(
+                        "SELECT key, value FROM entries WHERE key IN (%s)"
+                        % ", ".join("?" * len(batch)), batch)
+                    for digest, value in rows:
+                        try:
+                            found[hashes[digest]] = pickle.loads(value)
+                        except Exception:
+                            # Entries which can't be loaded are misses.
+                            pass
+                self.touch([hash_key(key) for key in found])
+        except sqlite3.Error:
+            found = {}
+        self.hits += len(found)
+        self.misses += len(keys) - len(found)
+        return found
+
+    def put(self, key, value):
+        """Add or replace an entry, evicting old entries if necessary.
+
+        Args:
+            key: The key of the entry.
+            value: The value of the entry. Must be picklable.
+        """
+        self.put_many({key: value})
+
+    def put_many(self, entries):
+        """Add or replace a batch of entries in a single transaction.
+
+        Args:
+            entries: A dict mapping keys to values.
+        """
+        if self.connection is None or not entries:
+            return
+        rows = []
+        for key, value in entries.items():
+            self.clock += 1
+            rows.append((hash_key(key), self.version, self.clock,
+                         pickle.dumps(value, pickle.HIGHEST_PROTOCOL)))
+        try:
+            with self.connection:
+                self.connection.executemany(
+                    "INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?)",
+                    rows)
+                self.evict()
+        except sqlite3.Error:
+            pass
+
+    def touch(self, digests):
+        """Mark hashed keys as the most recently used."""
+        rows = []
+        for digest in digests:
+            self.clock += 1
+            rows.append((self.clock, digest))
+        self.connection.executemany(
+            "UPDATE entries SET used = ? WHERE key = ?", rows)
+
+    def set_size(self, size):
+        """Change the maximum number of entries.
+
+        Args:
+            size: See DiskCache.size.
+        """
+        self.size = size
+        if self.connection is not None:
+            try:
+                with self.connection:
+                    self.evict()
+            except sqlite3.Error:
+                pass
+
+    def evict(self):
+        """Remove the least recently used entries until within size.
+
+        Must be called within a transaction.
+        """
+        count = self.connection.execute(
+            "SELECT COUNT(*) FROM entries").fetchone()[0]
+        excess = count - max(self.size, 0)
+        if excess > 0:
+            self.connection.execute(
+                "DELETE FROM entries WHERE key IN ("
+                "SELECT key FROM entries ORDER BY used LIMIT ?)", (excess,))
+
+    def clear(self):
+        """Remove all entries and reset the counters."""
+        self.hits = 0
+        self.misses = 0
+        if self.connection is not None:
+            try:
+                with self.connection:
+                    self.connection.execute("DELETE FROM entries")
+            except sqlite3.Error:
+                pass
+
+    def close(self):
+        """Close the database. The cache is empty afterwards."""
+        if self.connection is not None:
+            self.connection.close()
+            self.connection = None
+
+    def __len__(self):
+        if self.connection is None:
+            return 0
+        try:
+            return self.connection.execute(
+                "SELECT COUNT(*) FROM entries").fetchone()[0]
+        except sqlite3.Error:
+            return 0
+
+    def __contains__(self, key):
+        if self.connection is None:
+            return False
+        try:
+            return self.connection.execute(
+                "SELECT 1 FROM entries WHERE key = ?",
+                (hash_key(key),)).fetchone() is not None
+        except sqlite3.Error:
+            return False
+
+
+def hash_key(key):
+    """Hash a string key for storage in a DiskCache."""
+    return hashlib.sha1(key.encode("utf-8")).hexdigest()
@@ -0,0 +1,685 @@
+"""Classification
+
+Functions for classifying equations as shapes on an Argand diagram.
+Nothing here depends on Qt, so equations can be classified headlessly.
+
+Written by Sam Hubbard - samlhub@gmail.com
+Copyright (C) 2015 Sam Hubbard
+"""
+
+import os
+import copy
+import hashlib
+from math import pi
+from fractions import Fraction
+from functools import partial
+from concurrent.futures import ProcessPoolExecutor
+
+from geometry import *
+from abstract_syntax_tree import *
+from raster import Region, RASTER_AVAILABLE
+from contour import Contour, is_real
+from exact import ExactComplex
+
+
+# Special type for inputs that are valid but contain no points.
+TYPE_NULL = -1
+
+TYPE_POINT = 0
+
+TYPE_CIRCLE = 1
+TYPE_DISK = 2
+TYPE_NEGATIVE_DISK = 3
+
+TYPE_LINE = 4
+TYPE_HALF_PLANE = 5
+
+TYPE_RAY = 6
+TYPE_DUAL_RAY = 7
+TYPE_SECTOR = 8
+
+# Relations which can't be classified are rendered pixel by pixel.
+TYPE_REGION = 9
+
+TYPE_ANNULUS = 10
+
+# Equations which can't be classified are traced as contours.
+TYPE_CONTOUR = 11
+
+# Special type for inputs that hold for every point, such as |z| > -1.
+TYPE_PLANE = 12
+
+REL_LESS = "LESS"
+REL_LEQL = "LEQL"
+REL_EQL = "EQL"
+REL_MEQL = "MEQL"
+REL_MORE = "MORE"
+# Two chained relations, such as a < b < c.
+REL_AND = "AND"
+
+INEQUALITIES = [REL_LESS, REL_LEQL, REL_MEQL, REL_MORE]
+
+# Types of shape which fit in a bounding box. The rest extend to
+# infinity, or aren't known until they are drawn.
+BOUNDED_TYPES = [TYPE_POINT, TYPE_CIRCLE, TYPE_DISK, TYPE_ANNULUS]
+
+# The number of equations sent to a worker process at a time.
+CHUNK_SIZE = 64
+
+# Increase whenever parsing or classification changes, to invalidate
+# classifications cached on disk by earlier versions.
+CLASSIFICATION_VERSION = 6
+
+def invert_relation(relation):
+    if relation == REL_MORE: return REL_LESS
+    if relation == REL_MEQL: return REL_LEQL
+    if relation == REL_EQL: return REL_EQL
+    if relation == REL_LEQL: return REL_MEQL
+    if relation == REL_LESS: return REL_MORE
+
+
+class Classification:
+    """The shape described by an equation.
+
+    Attributes:
+        type: One of the TYPE_* constants.
+        relation: One of the REL_* constants.
+        shape: The geometry of the shape, such as a Circle, or None.
+            Its coordinates are always floats, for rendering.
+        exact_shape: When classified with exact arithmetic, the shape
+            with rational coordinates. Otherwise None.
+        bounds: The (left, bottom, right, top) bounding box of the
+            shape, or None if it is unbounded. Set by classify_equation.
+    """
+    __slots__ = ["type", "relation", "shape", "exact_shape", "bounds"]
+
+    def __init__(self, type, relation, shape, exact_shape=None):
+        """Create a new classification.
+
+        Args:
+            type: See Classification.type.
+            relation: See Classification.relation.
+            shape: See Classification.shape.
+            exact_shape: See Classification.exact_shape.
+        """
+        self.type = type
+        self.relation = relation
+        self.shape = shape
+        self.exact_shape = exact_shape
+        self.bounds = None
+
+    def __repr__(self):
+        return "Classification(%r, %r, %r)" % (
+            self.type, self.relation, self.shape)
+
+
+def classification_version():
+    """Get a string identifying how equations are currently classified.
+
+    As well as CLASSIFICATION_VERSION, this depends on the registered
+    operators and whether regions can be rendered, so classifications
+    cached on disk are invalidated when either changes.
+    """
+    operators = sorted(
+        (op.name, op.symbol, op.kind, op.precedence, op.left_associative)
+        for op in OPERATORS.values())
+    registry = repr((operators, sorted(TOKENS.items()), RASTER_AVAILABLE))
+    digest = hashlib.sha1(registry.encode()).hexdigest()
+    return "%d-%s" % (CLASSIFICATION_VERSION, digest)
+
+
+def normalize_equation(equation):
+    """Normalize an equation for use as a cache key.
+
+    Whitespace is only significant where it separates tokens, so the
+    key is the equation's tokens separated by single spaces. Equations
+    which can't be tokenized are keyed by the input string itself.
+    """
+    try:
+        return " ".join(token.value for token in tokenize(equation))
+    except TokenizeError:
+        # Tokens never contain newlines, so these keys are distinct.
+        return "\n" + equation
+
+
+def classify_equation(equation, parser=None, exact=False):
+    """Parse and classify an equation.
+
+    Args:
+        equation: The input string to parse.
+        parser: An optional SyntaxParser to parse the equation with,
+            such as an incremental parser following an input box.
+        exact: Whether to classify with exact rational arithmetic. If a
+            parser is given, its own SyntaxParser.exact is used instead.
+
+    Returns:
+        A Classification, or None if the equation
+        couldn't be parsed or classified.
+    """
+    if parser:
+        tree = parser.update(equation)
+        exact = parser.exact
+    else:
+        tree = SyntaxParser(equation, exact=exact).get_tree()
+    if not tree:
+        return None
+    result = classify(tree, exact) or classify_region(equation, tree) \
+        or classify_contour(equation, tree)
+    if result:
+        result.bounds = shape_bounds(result)
+    return result
+
+
+def classify_many(equations, processes=None, chunksize=CHUNK_SIZE,
+                  exact=False):
+    """Classify a batch of equations, without Qt.
+
+    Equations with the same key from normalize_equation are classified
+    once, using the first of them. The rest are split between a pool of
+    worker processes.
+
+    Args:
+        equations: An iterable of input strings.
+        processes: The number of worker processes. Defaults to the
+            number of processors. If 1, the equations are classified
+            in this process.
+        chunksize: The number of equations to send to a worker at once.
+        exact: Whether to classify with exact rational arithmetic.
+
+    Returns:
+        A list with the result of classify_equation for each equation,
+        in the same order.
+    """
+    equations = list(equations)
+    keys = [normalize_equation(equation) for equation in equations]
+    originals = {}
+    for key, equation in zip(keys, equations):
+        originals.setdefault(key, equation)
+    unique = list(originals.values())
+    processes = processes or os.cpu_count() or 1
+    function = partial(classify_equation, exact=exact)
+    if processes == 1 or len(unique) < 2:
+        results = list(map(function, unique))
+    else:
+        with ProcessPoolExecutor(processes) as pool:
+            results = list(pool.map(function, unique, chunksize=chunksize))
+    results = dict(zip(originals, results))
+    return [results[key] for key in keys]
+
+
+def shape_bounds(classification):
+    """Find the bounding box of a classified shape.
+
+    Args:
+        classification: A Classification.
+
+    Returns:
+        A (left, bottom, right, top) tuple of floats, or None if the
+        shape isn't bounded.
+    """
+    if classification.type not in BOUNDED_TYPES:
+        return None
+    return tuple(float(edge) for edge in classification.shape.bounds())
+
+
+def float_shape(value):
+    """Convert the exact numbers in a shape to floats, for rendering.
+
+    Args:
+        value: A shape, or any of the values it's made from.
+
+    Returns:
+        A copy of the value, with Fractions replaced by floats and
+        ExactComplex numbers replaced by complex floats.
+    """
+    if isinstance(value, Fraction):
+        return float(value)
+    if isinstance(value, ExactComplex):
+        return complex(value)
+    if isinstance(value, tuple):
+        return tuple(float_shape(item) for item in value)
+    if hasattr(value, "__dict__"):
+        shape = copy.copy(value)
+        for name, item in vars(value).items():
+            setattr(shape, name, float_shape(item))
+        return shape
+    return value
+
+
+def relation_name(tree):
+    """Get the name of the relation at the root of an AST, or None."""
+    if tree.code is None:
+        return None
+    return OPERATORS_BY_CODE[tree.code].name
+
+
+def same_tree(first, second):
+    """Test whether two ASTs are identical.
+
+    Args:
+        first: The root node of an AST.
+        second: The root node of another AST.
+
+    Returns:
+        True if the trees have the same structure, operators, numbers
+        and variables, otherwise False.
+    """
+    if first.type != second.type or first.value != second.value:
+        return False
+    if len(first.children) != len(second.children):
+        return False
+    return all(same_tree(a, b)
+               for a, b in zip(first.children, second.children))
+
+
+def classify_identity(left, right, relation):
+    """Classify a relation between identical halves, such as |z| = |z|,
+       which holds everywhere, or nowhere if it's strict."""
+    if relation not in INEQUALITIES + [REL_EQL]:
+        return None
+    if not same_tree(left, right):
+        return None
+    if relation in [REL_LESS, REL_MORE]:
+        return Classification(TYPE_NULL, relation, None)
+    return Classification(TYPE_PLANE, relation, None)
+
+
+def classify_region(equation, tree):
+    """Fall back to treating an inequality as a raster region.
+
+    This requires NumPy.
+
+    Args:
+        equation: The input string the AST was parsed from.
+        tree: The AST of the inequality.
+
+    Returns:
+        A Classification, or None if unsuccessful.
+    """
+    if not RASTER_AVAILABLE:
+        return None
+    relation = relation_name(tree)
+    if relation == REL_AND:
+        # Both of the chained relations must be inequalities.
+        if not all(relation_name(child) in INEQUALITIES
+                   for child in tree.children):
+            return None
+    elif relation not in INEQUALITIES:
+        return None
+    return Classification(TYPE_REGION, relation, Region(equation, tree))
+
+
+def classify_contour(equation, tree):
+    """Fall back to tracing an equation as a contour.
+
+    Both sides of the equation must be real, such as |z^2 + 1| = 2 or
+    arg(z^2) = 1, so that it describes a curve rather than points.
+
+    Args:
+        equation: The input string the AST was parsed from.
+        tree: The AST of the equation.
+
+    Returns:
+        A Classification, or None if unsuccessful.
+    """
+    if relation_name(tree) != REL_EQL:
+        return None
+    if not all(is_real(child) for child in tree.children):
+        return None
+    return Classification(TYPE_CONTOUR, REL_EQL, Contour(equation, tree))
+
+
+# Handlers which find the linear form of a node, by node type.
+FORM_HANDLERS = {}
+# Handlers which find the linear form of an operator node from its
+# children, by operator code. They return None if the node isn't linear.
+LINEAR_HANDLERS = {}
+# Handlers which classify the two halves of an equation, by the codes
+# of the operators at the root of each half. None matches any node.
+SHAPE_HANDLERS = {}
+
+
+def register_linear_handler(name, handler):
+    """Set the handler finding the linear form of an operator.
+
+    Args:
+        name: The name of the operator.
+        handler: A function taking the operator's child nodes, and
+            returning a (coefficient, offset) tuple or None.
+    """
+    LINEAR_HANDLERS[OPERATORS[name].code] = handler
+
+
+def register_shape_handler(left, right, handler):
+    """Set the handler classifying equations with a pair of operators.
+
+    A handler registered for a pair of operators is preferred over one
+    registered for the left operator and any right half, which is
+    preferred over one registered for any halves.
+
+    Args:
+        left: The name of the operator at the root of the left half, or
+            None to match any node.
+        right: The name of the operator at the root of the right half,
+            or None to match any node.
+        handler: A function taking the left and right halves and the
+            relation, and returning a Classification or None.
+    """
+    def code(name):
+        return None if name is None else OPERATORS[name].code
+    SHAPE_HANDLERS[code(left), code(right)] = handler
+
+
+def linear_form(node):
+    """Calculates the coefficient and offset of a node.
+       Returns a tuple: (coefficient, offset)."""
+    return FORM_HANDLERS[node.type](node)
+
+
+def operator_form(node):
+    """Calculates the coefficient and offset of an operator node."""
+    handler = LINEAR_HANDLERS.get(node.code)
+    if handler:
+        form = handler(*node.children)
+        if form:
+            return form
+    # This node doesn't support variable children (unless
+    # it is a root node, but we've already accounted for those).
+    # Just evaluate it numerically, and treat as an offset.
+    return (0, node.resolve())
+
+
+# All variables have coefficient 1.
+FORM_HANDLERS[NODE_TYPE_VAR] = lambda node: (1, 0)
+# All numbers represent an offset of their value.
+FORM_HANDLERS[NODE_TYPE_NUM] = lambda node: (0, node.value)
+FORM_HANDLERS[NODE_TYPE_OP] = operator_form
+
+
+def add_form(left, right):
+    a = linear_form(left)
+    b = linear_form(right)
+    return (a[0] + b[0], a[1] + b[1])
+
+
+def sub_form(left, right):
+    a = linear_form(left)
+    b = linear_form(right)
+    return (a[0] - b[0], a[1] - b[1])
+
+
+def mul_form(left, right):
+    a = linear_form(left)
+    b = linear_form(right)
+    # Only one child of a mul node may have a variable.
+    if (bool(a[0]) ^ bool(b[0])) and bool(a[0]):
+        return (a[0] * b[1], a[1] * b[1])
+    if (bool(a[0]) ^ bool(b[0])) and bool(b[0]):
+        return (a[1] * b[0], a[1] * b[1])
+    return None
+
+
+def div_form(left, right):
+    a = linear_form(left)
+    b = linear_form(right)
+    # Only the left child of a div node may have a var.
+    if b[0] == 0:
+        return (a[0] / b[1], a[1] / b[1])
+    return None
+
+
+register_linear_handler("add", add_form)
+register_linear_handler("sub", sub_form)
+register_linear_handler("mul", mul_form)
+register_linear_handler("div", div_form)
+
+
+def classify_bisector(left, right, relation):
+    """Classify |z - a| = |z - b| as a line, or an inequality of the
+       same form as a half plane."""
+    left_values = linear_form(left.children[0])
+    right_values = linear_form(right.children[0])
+    if left_values[0] != 1 or right_values[0] != 1:
+        # Lines only work where the coefficient
+        # of both sides is 1.
+        return None
+    if relation == REL_EQL:
+        # We have a perpendicular bisector (line).
+        type = TYPE_LINE
+    else:
+        # We have a half plane.
+        type = TYPE_HALF_PLANE
+    # p0 and p1 are the points to bisect.
+    p0 = Point(
+        -left_values[1].real,
+        -left_values[1].imag)
+    p1 = Point(
+        -right_values[1].real,
+        -right_values[1].imag)
+    if p0 == p1:
+        # If the points are the same, they cannot have
+        # a perpendicular bisector.
+        return None
+    center = Point((p0.x + p1.x) / 2, (p0.y + p1.y) / 2)
+    side = 0
+    if p0.y == p1.y:
+        # If the points are level, the bisector
+        # must be vertical.
+        gradient = float("inf")
+        intercept = center.x
+        if p0.x > p1.x:
+            side |= RIGHT
+    else:
+        # The gradient of the bisector is -1/m.
+        gradient = -(p1.x - p0.x) / (p1.y - p0.y)
+        intercept = center.y - gradient * center.x
+        if type == TYPE_HALF_PLANE:
+            # Should we shade above or below the line.
+            if p0.x > p1.x:
+                side |= RIGHT
+            if p0.y > p1.y:
+                side |= ABOVE
+    if relation in [REL_MORE, REL_MEQL]:
+        side = ~side
+    if type == TYPE_LINE:
+        return Classification(type, relation, Line(gradient, intercept))
+    else:
+        return Classification(type, relation,
+            HalfPlane(gradient, intercept, side))
+
+
+def classify_circle(left, right, relation):
+    """Classify |az - b| = c as a circle, or an inequality of the
+       same form as a disk."""
+    left_values = linear_form(left.children[0])
+    right_values = linear_form(right)
+    if right_values[0] != 0:
+        # The right half must be a constant.
+        return None
+    if right_values[1].imag != 0:
+        # The modulus function only outputs real values.
+        return Classification(TYPE_NULL, relation, None)
+    if right_values[1].real < 0:
+        # The modulus function only outputs positive values,
+        # so it is more than a negative bound everywhere.
+        if relation in [REL_MEQL, REL_MORE]:
+            return Classification(TYPE_PLANE, relation, None)
+        return Classification(TYPE_NULL, relation, None)
+    if relation == REL_EQL:
+        # We have a circle.
+        type = TYPE_CIRCLE
+    elif relation in [REL_LEQL, REL_LESS]:
+        # We have a disk.
+        type = TYPE_DISK
+    else:
+        # We have a negative disk.
+        type = TYPE_NEGATIVE_DISK
+    center = Point(
+        -left_values[1].real / left_values[0].real,
+        -left_values[1].imag / left_values[0].real)
+    radius = right_values[1].real / abs(left_values[0])
+    return Classification(type, relation, Circle(center, radius))
+
+
+def classify_dual_ray(left, right, relation):
+    """Classify arg(z - a) = arg(z - b) as a pair of rays."""
+    left_values = linear_form(left.children[0])
+    right_values = linear_form(right.children[0])
+    if left_values[0] != 1 or right_values[0] != 1:
+        # The coefficient of both sides must be 1.
+        return None
+    if relation == REL_EQL:
+        # We have a dual ray.
+        type = TYPE_DUAL_RAY
+    else:
+        # Inequalities are not supported for dual rays.
+        return None
+    endpoints = (
+        Point(-left_values[1].real, -left_values[1].imag),
+        Point(-right_values[1].real, -right_values[1].imag))
+    return Classification(type, relation, DualRay(endpoints))
+
+
+def classify_ray(left, right, relation):
+    """Classify arg(z - a) = b as a ray, or an inequality of the
+       same form as a sector."""
+    left_values = linear_form(left.children[0])
+    right_values = linear_form(right)
+    if left_values[0] != 1:
+        # The coefficient must be 1.
+        return None
+    endpoint = Point(
+        -left_values[1].real,
+        -left_values[1].imag)
+    if relation == REL_EQL:
+        # We have a ray.
+        angle = right_values[1].real % (2 * pi)
+        return Classification(TYPE_RAY, relation, Ray(angle, endpoint))
+    if right_values[0] != 0:
+        # The right half must be a constant.
+        return None
+    # We have a sector. The argument is in the range (-pi, pi], so
+    # one edge of the sector always points along the negative x-axis.
+    angle = right_values[1].real
+    if relation in [REL_LEQL, REL_LESS]:
+        start, end = -pi, min(angle, pi)
+    else:
+        start, end = max(angle, -pi), pi
+    if end <= start:
+        # No argument satisfies the inequality.
+        return Classification(TYPE_NULL, relation, None)
+    return Classification(TYPE_SECTOR, relation, Sector(endpoint, start, end))
+
+
+def classify_point(left, right, relation):
+    """Classify az + b = cz + d as a point."""
+    if relation != REL_EQL:
+        # More / less than doesn't work with complex numbers.
+        return None
+    # We probably have a point.
+    # If we don't, something will throw an error.
+    left_values = linear_form(left)
+    right_values = linear_form(right)
+    coefficient = left_values[0] - right_values[0]
+    value = (right_values[1] - left_values[1]) / coefficient
+    return Classification(TYPE_POINT, REL_EQL, Point(c=value))
+
+
+register_shape_handler("mod", "mod", classify_bisector)
+register_shape_handler("mod", None, classify_circle)
+register_shape_handler("ARG", "ARG", classify_dual_ray)
+register_shape_handler("ARG", None, classify_ray)
+register_shape_handler(None, None, classify_point)
+
+
+def classify_conjunction(first, second):
+    """Combine the classifications of two chained relations.
+
+    A disk and a negative disk with the same center make an annulus,
+    such as 1 < |z| < 2. A chain containing an empty relation is empty,
+    and a relation which holds everywhere leaves just the other one,
+    such as -1 < |z| < 2.
+
+    Args:
+        first: The Classification of the first relation, or None.
+        second: The Classification of the second relation, or None.
+
+    Returns:
+        A Classification, or None if unsuccessful.
+    """
+    if not first or not second:
+        return None
+    if TYPE_NULL in [first.type, second.type]:
+        return Classification(TYPE_NULL, REL_AND, None)
+    if first.type == TYPE_PLANE:
+        return second
+    if second.type == TYPE_PLANE:
+        return first
+    disks = {first.type: first, second.type: second}
+    if set(disks) != {TYPE_DISK, TYPE_NEGATIVE_DISK}:
+        return None
+    inner = disks[TYPE_NEGATIVE_DISK].shape
+    outer = disks[TYPE_DISK].shape
+    if inner.center != outer.center:
+        return None
+    strict = disks[TYPE_NEGATIVE_DISK].relation == REL_MORE \
+        or disks[TYPE_DISK].relation == REL_LESS
+    if inner.radius == outer.radius and not strict:
+        # The edges meet, so only the circle is left.
+        return Classification(TYPE_CIRCLE, REL_EQL, outer)
+    if inner.radius >= outer.radius:
+        return Classification(TYPE_NULL, REL_AND, None)
+    if strict:
+        relation = REL_LESS
+    else:
+        relation = REL_LEQL
+    return Classification(
+        TYPE_ANNULUS, relation,
+        Annulus(outer.center, inner.radius, outer.radius))
+
+
+def classify(tree, exact=False):
+    """Attempt to classify the AST as a particular type
+       Argand diagram.
+
+    Args:
+        tree: An AST to attempt to classify.
+        exact: Whether the numbers in the tree are ExactComplex objects.
+            If so, the exact shape is kept in Classification.exact_shape,
+            and a copy with float coordinates is made for rendering.
+
+    Returns:
+        A Classification, or None if unsuccessful.
+    """
+    def inspect(left, right, relation="EQL"):
+        """Attempts to classify the equation based
+           on its two halves. Call with the halves' order
+           switched to account for all possibilities."""
+        handler = SHAPE_HANDLERS.get((left.code, right.code)) \
+            or SHAPE_HANDLERS.get((left.code, None)) \
+            or SHAPE_HANDLERS.get((None, None))
+        return handler(left, right, relation)
+
+    # If the code throws an error, the input is probably wrong.
+    try:
+        # Get the relation from the root node,
+        # which is probably a relation node.
+        relation = relation_name(tree)
+        if relation == REL_AND:
+            # Classify each of the chained relations, and combine them.
+            result = classify_conjunction(
+                classify(tree.children[0]), classify(tree.children[1]))
+        else:
+            # Get the right and left halves of the equation.
+            left = tree.children[0]
+            right = tree.children[1]
+            result = classify_identity(left, right, relation) \
+                or inspect(left, right, relation) \
+                or inspect(right, left, invert_relation(relation))
+        if exact and result:
+            # Raises OverflowError for shapes too large for floats.
+            result.exact_shape = result.shape
+            result.shape = float_shape(result.shape)
+    except Exception:
+        return None
+    return result
@@ -0,0 +1,399 @@
+"""Contour
+
+Traces curves which can't be classified as simple shapes, by adaptive
+marching squares over the viewport.
+
+Written by Sam Hubbard - samlhub@gmail.com
+Copyright (C) 2015 Sam Hubbard
+"""
+
+from math import ceil, floor, isfinite, sqrt
+
+from abstract_syntax_tree import *
+from geometry import Point
+
+
+# The size in pixels of the cells of the coarse grid, and of the finest
+# cells they are subdivided into. The ratio must be a power of two.
+COARSE_CELL = 32
+FINE_CELL = 2
+# How much the gradient may grow across a cell before a zero is missed.
+SAFETY = 2
+# The number of Newton steps used to move points onto the curve.
+REFINE_STEPS = 2
+
+# Operators whose value is real, and operators which give real values
+# when their arguments are real.
+REAL_OPERATORS = ["mod", "ARG"]
+REAL_PRESERVING_OPERATORS = [
+    "add", "sub", "mul", "div", "neg", "pos", "SIN", "COS", "TAN"]
+
+
+class Contour:
+    """Stores a curve as the set of points where an equation holds.
+
+    Both sides of the equation must be real-valued, so that the curve
+    is the zero set of their difference, the residual.
+
+    Only the equation is pickled; the tree is rebuilt when unpickled.
+
+    Attributes:
+        equation: The input string describing the curve.
+        tree: The root node of the equation's AST.
+        function: The compiled function of the tree's left side minus
+            its right side.
+    """
+    def __init__(self, equation, tree=None):
+        """Create a new contour.
+
+        Args:
+            equation: See Contour.equation.
+            tree: See Contour.tree. If not given, the equation is parsed.
+        """
+        self.equation = equation
+        self.tree = tree or SyntaxParser(equation).get_tree()
+        left, right = [child.compile() for child in self.tree.children]
+        self.function = lambda z: left(z) - right(z)
+
+    def __getstate__(self):
+        return {"equation": self.equation}
+
+    def __setstate__(self, state):
+        self.__init__(state["equation"])
+
+    def residual(self, z):
+        """Evaluate the residual, which is zero on the curve.
+
+        Args:
+            z: A complex number.
+
+        Returns:
+            The residual as a float, or NaN where it is undefined.
+        """
+        try:
+            value = complex(self.function(z)).real
+        except (ArithmeticError, ValueError):
+            return float("nan")
+        return value
+
+    def gradient(self, z):
+        """Evaluate the residual with its gradient.
+
+        Args:
+            z: A complex number.
+
+        Returns:
+            A (residual, d/dx, d/dy) tuple of floats, or None where the
+            residual can't be differentiated.
+        """
+        try:
+            dual = self.tree.differentiate(z)
+        except (ArithmeticError, ValueError):
+            return None
+        return (complex(dual.value).real,) + dual.gradient()
+
+
+def is_real(node):
+    """Test whether a node always has a real value.
+
+    Args:
+        node: The root node of an AST.
+
+    Returns:
+        True if the node is real for every value of its variable, or
+        False if it might not be.
+    """
+    if node.type == NODE_TYPE_NUM:
+        return not complex(node.value).imag
+    if node.type == NODE_TYPE_VAR:
+        return False
+    name = CODE_NAMES.get(node.value)
+    if name in REAL_OPERATORS:
+        return True
+    if name in REAL_PRESERVING_OPERATORS:
+        return all(is_real(child) for child in node.children)
+    return False
+
+
+def coarse_cells(width, height, origin, zoom):
+    """Find the cells of the coarse grid covering a grid of pixels.
+
+    Cells are indexed from the origin of the plane, in units of the
+    finest cell, so the same cells are found for overlapping grids.
+
+    Args:
+        width: The width of the grid in pixels.
+        height: The height of the grid in pixels.
+        origin: The point at the corner of pixel (0, 0).
+        zoom: The number of pixels per unit.
+
+    Returns:
+        A list of the (i, j) indices of the cells' corners.
+    """
+    step = FINE_CELL / zoom
+    coarse = COARSE_CELL // FINE_CELL
+    i0 = floor(origin.x / step / coarse) * coarse
+    j0 = floor(origin.y / step / coarse) * coarse
+    i1 = ceil((origin.x + width / zoom) / step)
+    j1 = ceil((origin.y + height / zoom) / step)
+    return [(i, j) for i in range(i0, i1, coarse)
+            for j in range(j0, j1, coarse)]
+
+
+def trace(contour, width, height, origin, zoom, refine=True):
+    """Find the polylines making up a contour within a grid of pixels.
+
+    The residual is sampled at the corners of a coarse grid of cells.
+    Cells which might contain part of the curve are split into quarters
+    until they are FINE_CELL pixels across, and the curve is found in
+    each of these by marching squares. A cell might contain part of the
+    curve if the residual changes sign across its corners, or if the
+    residual at its center is small compared to the gradient there, so
+    the cost depends on the length of the curve rather than the number
+    of pixels. Cells where the gradient at the center is zero are only
+    split if the residual changes sign, so a residual which is zero
+    everywhere, such as that of |z| - |z| = 0, isn't split to the finest
+    cells.
+
+    Where the residual jumps across zero rather than passing through it,
+    such as at the branch cut of arg, the estimated distance to the curve
+    is large, and no line is drawn.
+
+    Args:
+        contour: The contour to trace.
+        width: The width of the grid in pixels.
+        height: The height of the grid in pixels.
+        origin: The point at the corner of pixel (0, 0).
+        zoom: The number of pixels per unit.
+        refine: Whether to move the points of the polylines onto the
+            curve with Newton's method, rather than interpolating them
+            linearly along the edges of cells.
+
+    Returns:
+        A list of lists of Points, each of which is a polyline. Closed
+        polylines end with their first point.
+    """
+    return trace_cells(
+        contour, coarse_cells(width, height, origin, zoom), zoom, refine)
+
+
+def trace_tiles(contour, corners, size, zoom, margin=0, refine=True):
+    """Find the polylines making up a contour within several tiles.
+
+    The tiles are traced together, as by trace, so the cells they share
+    are only traced once.
+
+    Args:
+        contour: The contour to trace.
+        corners: The points at the corners of the tiles.
+        size: The width of the tiles in pixels.
+        zoom: The number of pixels per unit.
+        margin: The number of pixels around each tile to trace as well.
+        refine: See trace.
+
+    Returns:
+        A list of polylines, as returned by trace.
+    """
+    cells = set()
+    for corner in corners:
+        cells.update(coarse_cells(
+            size + 2 * margin, size + 2 * margin,
+            corner - (margin / zoom, margin / zoom), zoom))
+    return trace_cells(contour, sorted(cells), zoom, refine)
+
+
+def trace_cells(contour, cells, zoom, refine=True):
+    """Find the polylines making up a contour within cells of the
+       coarse grid.
+
+    Args:
+        contour: The contour to trace.
+        cells: A list of cells, as returned by coarse_cells.
+        zoom: The number of pixels per unit.
+        refine: See trace.
+
+    Returns:
+        A list of polylines, as returned by trace.
+    """
+    step = FINE_CELL / zoom
+    coarse = COARSE_CELL // FINE_CELL
+    samples = {}
+    crossings = {}
+
+    def sample(i, j):
+        """Find the residual at a corner of the grid."""
+        if (i, j) not in samples:
+            samples[i, j] = contour.residual(complex(i * step, j * step))
+        return samples[i, j]
+
+    def may_contain(i, j, size):
+        """Test whether a cell might contain part of the curve."""
+        corners = [sample(i, j), sample(i + size, j),
+                   sample(i, j + size), sample(i + size, j + size)]
+        if not all(isfinite(value) for value in corners):
+            return True
+        if min(corners) < 0 <= max(corners):
+            return True
+        # Curves which don't cross the corners can still pass through.
+        half = size * step / 2
+        result = contour.gradient(complex(i * step + half, j * step + half))
+        if result is None:
+            return False
+        value, dx, dy = result
+        if not dx and not dy:
+            return False
+        return abs(value) <= SAFETY * sqrt(2) * half * sqrt(dx * dx + dy * dy)
+
+    def crossing(edge):
+        """Find the point where the curve crosses the edge of a cell.
+
+        Edges are ("h", i, j) from corner (i, j) to (i + 1, j), or
+        ("v", i, j) from corner (i, j) to (i, j + 1). Returns None if
+        the residual only jumps across zero.
+        """
+        if edge in crossings:
+            return crossings[edge]
+        direction, i, j = edge
+        a = sample(i, j)
+        if direction == "h":
+            b = sample(i + 1, j)
+            z = complex(i + a / (a - b), j) * step
+        else:
+            b = sample(i, j + 1)
+            z = complex(i, j + a / (a - b)) * step
+        for _ in range(REFINE_STEPS if refine else 1):
+            result = contour.gradient(z)
+            if result is None:
+                break
+            value, dx, dy = result
+            length = dx * dx + dy * dy
+            if not length:
+                break
+            move = complex(dx, dy) * (-value / length)
+            if abs(move) > step:
+                # Too far from the edge to be a crossing.
+                z = None
+                break
+            if not refine:
+                break
+            z += move
+        if z is not None:
+            z = Point(z.real, z.imag)
+        crossings[edge] = z
+        return z
+
+    def march(i, j):
+        """Find the segments of the curve within a finest cell."""
+        corners = [sample(i, j), sample(i + 1, j),
+                   sample(i + 1, j + 1), sample(i, j + 1)]
+        if not all(isfinite(value) for value in corners):
+            return []
+        signs = [value >= 0 for value in corners]
+        edges = [("h", i, j), ("v", i + 1, j), ("h", i, j + 1), ("v", i, j)]
+        # Edge k joins corners k and k + 1.
+        crossed = [edges[k] for k in range(4)
+                   if signs[k] != signs[(k + 1) % 4]]
+        if len(crossed) == 2:
+            pairs = [crossed]
+        elif len(crossed) == 4:
+            # A saddle: the center decides which corners are joined.
+            center = contour.residual(complex(i + 0.5, j + 0.5) * step)
+            if (center >= 0) == signs[0]:
+                pairs = [(edges[0], edges[1]), (edges[2], edges[3])]
+            else:
+                pairs = [(edges[3], edges[0]), (edges[1], edges[2])]
+        else:
+            pairs = []
+        return [pair for pair in pairs
+                if crossing(pair[0]) and crossing(pair[1])]
+
+    def subdivide(i, j, size):
+        """Find the segments of the curve within a cell."""
+        if not may_contain(i, j, size):
+            return []
+        if size == 1:
+            return march(i, j)
+        half = size // 2
+        return (subdivide(i, j, half) + subdivide(i + half, j, half)
+                + subdivide(i, j + half, half)
+                + subdivide(i + half, j + half, half))
+
+    segments = []
+    for i, j in cells:
+        segments += subdivide(i, j, coarse)
+    return join_segments(segments, crossings)
+
+
+def split_polylines(polylines, size, margin=0):
+    """Split polylines between the square tiles they pass through.
+
+    Args:
+        polylines: A list of polylines, as returned by trace.
+        size: The width of the tiles. Tile (i, j) has its corner at
+            (i, j) * size.
+        margin: How far outside a tile a segment may be and still be
+            kept for it.
+
+    Returns:
+        A dict mapping the (i, j) indices of tiles to lists of polylines,
+        made of the runs of segments of the polylines near each tile.
+    """
+    tiles = {}
+    for polyline in polylines:
+        # The run of segments each tile is collecting from the polyline.
+        runs = {}
+        for a, b in zip(polyline, polyline[1:]):
+            i0 = floor((min(a.x, b.x) - margin) / size)
+            i1 = floor((max(a.x, b.x) + margin) / size)
+            j0 = floor((min(a.y, b.y) - margin) / size)
+            j1 = floor((max(a.y, b.y) + margin) / size)
+            for i in range(i0, i1 + 1):
+                for j in range(j0, j1 + 1):
+                    run = runs.get((i, j))
+                    if run is None or run[-1] is not a:
+                        run = [a]
+                        runs[i, j] = run
+                        tiles.setdefault((i, j), []).append(run)
+                    run.append(b)
+    return tiles
+
+
+def join_segments(segments, points):
+    """Join segments which share an end into polylines.
+
+    Args:
+        segments: A list of pairs of keys of the ends of the segments.
+            Each key may be the end of at most two segments.
+        points: A dict mapping the keys to Points.
+
+    Returns:
+        A list of lists of Points, as returned by trace.
+    """
+    neighbours = {}
+    for a, b in segments:
+        neighbours.setdefault(a, []).append(b)
+        neighbours.setdefault(b, []).append(a)
+    # Start with the open ends, so open polylines aren't split.
+    starts = [key for key, keys in neighbours.items() if len(keys) == 1]
+    starts += [key for key, keys in neighbours.items() if len(keys) != 1]
+    visited = set()
+    polylines = []
+    for start in starts:
+        if start in visited:
+            continue
+        line = [start]
+        visited.add(start)
+        key = start
+        while True:
+            following = [other for other in neighbours[key]
+                         if other not in visited]
+            if not following:
+                break
+            key = following[0]
+            visited.add(key)
+            line.append(key)
+        if len(line) > 2 and start in neighbours[key]:
+            # Close loops.
+            line.append(start)
+        polylines.append([points[key] for key in line])
+    return polylines
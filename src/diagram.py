@@ -14,7 +14,7 @@ from math import log10
 from PyQt4.QtCore import *
 from PyQt4.QtGui import *
 
-from plot import Plot
+from plot import Plot, ROLE_EQUATION, load_classifications
 from plot_list import PlotListModel
 from geometry import Point
 
@@ -159,9 +159,17 @@ class Diagram(QObject):
         buffer = QBuffer(plot_bytes)
         buffer.open(QIODevice.ReadOnly)
         stream = QDataStream(buffer)
+        plots = []
         while not stream.atEnd():
             plot = Plot()
             stream >> plot
+            plots.append(plot)
+        # Classifications aren't serialised, so rebuild them in one batch.
+        equations = [plot.data(ROLE_EQUATION) or "" for plot in plots]
+        classifications = load_classifications(equations)
+        for plot, equation, classification in zip(
+                plots, equations, classifications):
+            plot.set_classification(equation, classification)
             self.plots.append(plot)
         self.zoom = data[1]
         self.translation = data[2]
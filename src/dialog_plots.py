@@ -69,6 +69,10 @@ class DialogPlots(QDockWidget):
         self.validation_timer.setSingleShot(True)
         self.validation_timer.timeout.connect(self.validate)
 
+        # Successive edits of the input share most of their parse, so an
+        # incremental parser only has to re-match the edited region.
+        self.parser = SyntaxParser("", incremental=True)
+
         # Set the standard colors in the QColorDialog.
         index = 0
         for i in range(0, 16):
@@ -229,11 +233,24 @@ class DialogPlots(QDockWidget):
         color = QApplication.palette().color(QPalette.Base)
         if self.current_plot:
             plot = self.list.model().itemFromIndex(self.current_plot)
-            if text != plot.data(ROLE_EQUATION):
-                if not plot.set_equation(text):
-                    color = QColor(250, 180, 180)
+            if text == plot.data(ROLE_EQUATION):
+                # The input was reverted to the plot's valid equation,
+                # so any error shown is out of date.
+                self.equation.setToolTip("")
+            elif not plot.set_equation(text, self.parser):
+                color = QColor(250, 180, 180)
+                # Cached failures skip the parser, so parse again
+                # to find out what went wrong.
+                if self.parser.equation != text:
+                    self.parser.update(text)
+                if self.parser.error:
+                    self.equation.setToolTip(str(self.parser.error))
                 else:
-                    self.program.window.diagram.draw()
+                    self.equation.setToolTip(
+                        "This equation can't be plotted.")
+            else:
+                self.equation.setToolTip("")
+                self.program.window.diagram.draw()
 
         palette = QPalette()
         palette.setColor(QPalette.Base, color)
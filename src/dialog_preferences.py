@@ -35,12 +35,17 @@ class DialogPreferences(QDialog):
         """Create and add widgets to the viewport."""
         # Create labels.
         self.stroke_label = QLabel("Stroke width:")
+        self.frame_rate_label = QLabel("Frame rate limit:")
         #self.font_size_label = QLabel("Font size:")
 
         # Create integer inputs.
         self.stroke = QSpinBox()
         self.stroke.setRange(1, 10)
         self.stroke.setValue(self.preferences.stroke)
+        self.frame_rate = QSpinBox()
+        self.frame_rate.setRange(10, 240)
+        self.frame_rate.setSuffix(" fps")
+        self.frame_rate.setValue(self.preferences.frame_rate)
         #self.font_size = QSpinBox()
         #self.font_size.setRange(12, 24)
         #self.font_size.setValue(self.preferences.font_size)
@@ -72,6 +77,8 @@ class DialogPreferences(QDialog):
         # Add everything to the grid.
         grid.addWidget(self.stroke_label, 0, 0)
         grid.addWidget(self.stroke, 0, 1)
+        grid.addWidget(self.frame_rate_label, 1, 0)
+        grid.addWidget(self.frame_rate, 1, 1)
         #grid.addWidget(self.font_size_label, 1, 0)
         #grid.addWidget(self.font_size, 1, 1)
         grid.addWidget(self.divider, 0, 2, 2, 1)
@@ -88,6 +95,7 @@ class DialogPreferences(QDialog):
         preferences object.
         """
         self.preferences.stroke = self.stroke.value()
+        self.preferences.frame_rate = self.frame_rate.value()
         #self.preferences.font_size = self.font_size.value()
         self.preferences.label_axes = self.label_axes.isChecked()
         self.preferences.label_points = self.label_points.isChecked()
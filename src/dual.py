@@ -0,0 +1,175 @@
+"""Dual
+
+Forward-mode automatic differentiation of functions of a complex
+variable, for tracing curves with Newton's method.
+
+Written by Sam Hubbard - samlhub@gmail.com
+Copyright (C) 2015 Sam Hubbard
+"""
+
+import cmath
+
+
+class Dual:
+    """Stores the value of a function of z = x + iy at a point, with its
+    partial derivatives with respect to x and y.
+
+    Partial derivatives are used rather than a complex derivative, so
+    that functions which aren't holomorphic, such as |z| and arg(z),
+    can be differentiated too. For holomorphic functions, dy is always
+    i times dx, and dx is the complex derivative.
+
+    Attributes:
+        value: The value of the function.
+        dx: The partial derivative with respect to x.
+        dy: The partial derivative with respect to y.
+    """
+    __slots__ = ["value", "dx", "dy"]
+
+    def __init__(self, value, dx=0, dy=0):
+        """Create a new dual number.
+
+        Args:
+            value: See Dual.value.
+            dx: See Dual.dx. Defaults to zero, for constants.
+            dy: See Dual.dy. Defaults to zero, for constants.
+        """
+        self.value = value
+        self.dx = dx
+        self.dy = dy
+
+    @classmethod
+    def variable(cls, z):
+        """Create the dual number of the variable itself, at z."""
+        return cls(z, 1, 1j)
+
+    def jacobian(self):
+        """Find the Jacobian matrix of the function, treated as a map
+        from (x, y) to (real part, imaginary part).
+
+        Returns:
+            A tuple of rows, ((du/dx, du/dy), (dv/dx, dv/dy)), where u
+            and v are the real and imaginary parts of the function.
+        """
+        dx = complex(self.dx)
+        dy = complex(self.dy)
+        return ((dx.real, dy.real), (dx.imag, dy.imag))
+
+    def gradient(self):
+        """Find the gradient of the real part of the function.
+
+        Returns:
+            A tuple (du/dx, du/dy).
+        """
+        return (complex(self.dx).real, complex(self.dy).real)
+
+    def __repr__(self):
+        return "Dual(%r, %r, %r)" % (self.value, self.dx, self.dy)
+
+
+def chain_rule(a, value, derivative):
+    """Apply the chain rule for a function of one argument.
+
+    Args:
+        a: The Dual of the argument.
+        value: The value of the function at a.value.
+        derivative: The complex derivative of the function at a.value.
+
+    Returns:
+        The Dual of the function applied to a.
+    """
+    return Dual(value, derivative * a.dx, derivative * a.dy)
+
+
+def add_derivative(a, b):
+    return Dual(a.value + b.value, a.dx + b.dx, a.dy + b.dy)
+
+
+def sub_derivative(a, b):
+    return Dual(a.value - b.value, a.dx - b.dx, a.dy - b.dy)
+
+
+def mul_derivative(a, b):
+    return Dual(a.value * b.value,
+                a.dx * b.value + a.value * b.dx,
+                a.dy * b.value + a.value * b.dy)
+
+
+def div_derivative(a, b):
+    # Raises ZeroDivisionError, like complex division.
+    value = a.value / b.value
+    return Dual(value,
+                (a.dx - value * b.dx) / b.value,
+                (a.dy - value * b.dy) / b.value)
+
+
+def pow_derivative(a, b):
+    value = a.value ** b.value
+    if not b.dx and not b.dy:
+        # Constant exponents don't need the logarithm of the base,
+        # which doesn't exist at zero.
+        if not b.value:
+            return Dual(value)
+        return chain_rule(a, value, b.value * a.value ** (b.value - 1))
+    log = cmath.log(a.value)
+    return Dual(value,
+                value * (b.dx * log + b.value * a.dx / a.value),
+                value * (b.dy * log + b.value * a.dy / a.value))
+
+
+def neg_derivative(a):
+    return Dual(-a.value, -a.dx, -a.dy)
+
+
+def pos_derivative(a):
+    return a
+
+
+def mod_derivative(a):
+    # The modulus r of w changes by Re(conj(w) dw) / r.
+    w = complex(a.value)
+    r = abs(w)
+    return Dual(r,
+                (w.conjugate() * a.dx).real / r,
+                (w.conjugate() * a.dy).real / r)
+
+
+def arg_derivative(a):
+    # The argument of w changes by Im(conj(w) dw) / |w|^2.
+    w = complex(a.value)
+    r2 = w.real ** 2 + w.imag ** 2
+    return Dual(cmath.phase(w),
+                (w.conjugate() * a.dx).imag / r2,
+                (w.conjugate() * a.dy).imag / r2)
+
+
+def sin_derivative(a):
+    return chain_rule(a, cmath.sin(a.value), cmath.cos(a.value))
+
+
+def cos_derivative(a):
+    return chain_rule(a, cmath.cos(a.value), -cmath.sin(a.value))
+
+
+def tan_derivative(a):
+    return chain_rule(a, cmath.tan(a.value), 1 / cmath.cos(a.value) ** 2)
+
+
+def sqrt_derivative(a):
+    value = cmath.sqrt(a.value)
+    return chain_rule(a, value, 1 / (2 * value))
+
+
+def equality_derivative(a, b):
+    """Differentiate an equation as the difference of its sides, which
+    is zero on the curve it describes."""
+    return sub_derivative(a, b)
+
+
+def inequality_derivative(a, b):
+    """Differentiate an inequality as the difference of the real parts
+    of its sides, which is zero on its boundary."""
+    difference = sub_derivative(a, b)
+    return Dual(complex(difference.value).real,
+                complex(difference.dx).real,
+                complex(difference.dy).real)
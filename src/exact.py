@@ -0,0 +1,204 @@
+"""Exact
+
+Complex numbers with rational parts, for classifying equations
+without rounding errors.
+
+Written by Sam Hubbard - samlhub@gmail.com
+Copyright (C) 2015 Sam Hubbard
+"""
+
+import numbers
+from fractions import Fraction
+from math import hypot, isfinite
+
+
+# Integer powers whose parts would have more bits than this are found
+# with complex floats, so huge powers can't take too long.
+MAX_EXACT_BITS = 4096
+
+
+class ExactComplex:
+    """Stores a complex number with rational real and imaginary parts.
+
+    Addition, subtraction, multiplication, division and integer powers
+    are exact. Anything else, such as the functions in cmath, converts
+    the number to a complex float first.
+
+    Attributes:
+        real: The real part, as a Fraction.
+        imag: The imaginary part, as a Fraction.
+    """
+    __slots__ = ["real", "imag"]
+
+    def __init__(self, real=0, imag=0):
+        """Create a new number.
+
+        Args:
+            real: See ExactComplex.real. Any rational number.
+            imag: See ExactComplex.imag. Any rational number.
+        """
+        self.real = Fraction(real)
+        self.imag = Fraction(imag)
+
+    @classmethod
+    def from_string(cls, string):
+        """Create a number from a decimal string, like complex().
+
+        Args:
+            string: A decimal such as "2.5", or an imaginary decimal
+                such as "0.5j".
+
+        Raises:
+            ValueError: The string is not a valid number.
+        """
+        if string.endswith("j"):
+            return cls(0, Fraction(string[:-1]))
+        return cls(Fraction(string))
+
+    def __complex__(self):
+        return complex(float(self.real), float(self.imag))
+
+    def __bool__(self):
+        return bool(self.real or self.imag)
+
+    def __repr__(self):
+        return "ExactComplex(%s, %s)" % (self.real, self.imag)
+
+    def __eq__(self, other):
+        value = exact(other)
+        if value is None:
+            if isinstance(other, numbers.Number):
+                return complex(self) == other
+            return NotImplemented
+        return self.real == value.real and self.imag == value.imag
+
+    def __hash__(self):
+        # Numbers which compare equal must hash equally, so hash like
+        # the Fraction or complex float with the same value, if any.
+        if not self.imag:
+            return hash(self.real)
+        try:
+            value = complex(self)
+        except OverflowError:
+            return hash((self.real, self.imag))
+        if exact(value) == self:
+            return hash(value)
+        return hash((self.real, self.imag))
+
+    def __neg__(self):
+        return ExactComplex(-self.real, -self.imag)
+
+    def __pos__(self):
+        return self
+
+    def __abs__(self):
+        # The modulus is only rational along the axes.
+        if not self.imag:
+            return abs(self.real)
+        if not self.real:
+            return abs(self.imag)
+        return hypot(self.real, self.imag)
+
+    def __add__(self, other):
+        value = exact(other)
+        if value is None:
+            return fallback(self, other, complex.__add__)
+        return ExactComplex(self.real + value.real, self.imag + value.imag)
+
+    def __radd__(self, other):
+        return self + other
+
+    def __sub__(self, other):
+        value = exact(other)
+        if value is None:
+            return fallback(self, other, complex.__sub__)
+        return ExactComplex(self.real - value.real, self.imag - value.imag)
+
+    def __rsub__(self, other):
+        return -self + other
+
+    def __mul__(self, other):
+        value = exact(other)
+        if value is None:
+            return fallback(self, other, complex.__mul__)
+        return ExactComplex(
+            self.real * value.real - self.imag * value.imag,
+            self.real * value.imag + self.imag * value.real)
+
+    def __rmul__(self, other):
+        return self * other
+
+    def __truediv__(self, other):
+        value = exact(other)
+        if value is None:
+            return fallback(self, other, complex.__truediv__)
+        # Raises ZeroDivisionError, like complex division.
+        scale = 1 / (value.real ** 2 + value.imag ** 2)
+        return ExactComplex(
+            (self.real * value.real + self.imag * value.imag) * scale,
+            (self.imag * value.real - self.real * value.imag) * scale)
+
+    def __rtruediv__(self, other):
+        value = exact(other)
+        if value is None:
+            return fallback(self, other, complex.__rtruediv__)
+        return value / self
+
+    def __pow__(self, other):
+        value = exact(other)
+        if value is None or value.imag or value.real.denominator != 1:
+            return fallback(self, other, complex.__pow__)
+        exponent = int(value.real)
+        bits = max(part.bit_length() for part in (
+            self.real.numerator, self.real.denominator,
+            self.imag.numerator, self.imag.denominator))
+        if bits * abs(exponent) > MAX_EXACT_BITS:
+            return fallback(self, other, complex.__pow__)
+        # Integer powers are found by repeated squaring.
+        result = ExactComplex(1)
+        base = self
+        for bit in bin(abs(exponent))[2:]:
+            result = result * result
+            if bit == "1":
+                result = result * base
+        if exponent < 0:
+            return 1 / result
+        return result
+
+    def __rpow__(self, other):
+        value = exact(other)
+        if value is None:
+            return fallback(self, other, complex.__rpow__)
+        return value ** self
+
+
+def exact(value):
+    """Convert a number to an ExactComplex, if it can be represented.
+
+    Floats are converted to the exact value of their binary fraction.
+
+    Args:
+        value: The number to convert.
+
+    Returns:
+        An ExactComplex, or None if the value is not a number, or is
+        infinite or NaN.
+    """
+    if isinstance(value, ExactComplex):
+        return value
+    if isinstance(value, numbers.Rational):
+        return ExactComplex(value)
+    if isinstance(value, numbers.Complex):
+        value = complex(value)
+        if isfinite(value.real) and isfinite(value.imag):
+            return ExactComplex(
+                Fraction(value.real), Fraction(value.imag))
+    return None
+
+
+def fallback(number, other, operation):
+    """Apply an operation to complex floats, for numbers with no exact
+       representation."""
+    if not isinstance(other, numbers.Number):
+        return NotImplemented
+    return operation(complex(number), complex(other))
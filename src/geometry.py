@@ -68,6 +68,14 @@ class Point:
     def __repr__(self):
         return "Point" + repr((self.x, self.y))
 
+    def bounds(self):
+        """Get the bounding box of the point.
+
+        Returns:
+            A (left, bottom, right, top) tuple.
+        """
+        return (self.x, self.y, self.x, self.y)
+
     def __getitem__(self, index):
         if index == 0:
             return self.x
@@ -117,6 +125,15 @@ class Circle:
         """
         return 2 * self.radius
 
+    def bounds(self):
+        """Get the axis-aligned bounding box of the circle.
+
+        Returns:
+            A (left, bottom, right, top) tuple.
+        """
+        return (self.center.x - self.radius, self.center.y - self.radius,
+                self.center.x + self.radius, self.center.y + self.radius)
+
     def point(self, theta):
         """Calculate a point on the circle.
 
@@ -130,6 +147,39 @@ class Circle:
         return self.center + Point(cos(theta), sin(theta)) * self.radius
 
 
+class Annulus:
+    """Stores the ring between two circles with the same center.
+
+    Attributes:
+        center: A point describing the center of the circles.
+        inner: The radius of the inner circle.
+        outer: The radius of the outer circle.
+    """
+    def __init__(self, center, inner, outer):
+        """Create a new annulus.
+
+        Args:
+            center: A point describing the center of the circles.
+            inner: The radius of the inner circle.
+            outer: The radius of the outer circle.
+        """
+        self.center = center
+        self.inner = inner
+        self.outer = outer
+
+    def inner_circle(self):
+        """Get the inner edge of the annulus as a circle."""
+        return Circle(self.center, self.inner)
+
+    def outer_circle(self):
+        """Get the outer edge of the annulus as a circle."""
+        return Circle(self.center, self.outer)
+
+    def bounds(self):
+        """Get the axis-aligned bounding box of the annulus."""
+        return self.outer_circle().bounds()
+
+
 class Line:
     """Stores line by gradient and intercept.
 
@@ -257,6 +307,36 @@ class DualRay:
         self.rays = (Ray(angle, endpoints[1]), Ray(angle + pi, endpoints[0]))
 
 
+class Sector:
+    """Stores the region between two rays with the same endpoint.
+
+    Attributes:
+        endpoint: The point to project the rays from.
+        start: The angle of the first ray.
+        end: The angle of the second ray. The sector covers the angles
+            anti-clockwise from start to end.
+    """
+    def __init__(self, endpoint, start, end):
+        """Create a new sector.
+
+        Args:
+            endpoint: The point to project the rays from.
+            start: The angle of the first ray.
+            end: The angle of the second ray, at most one turn after start.
+        """
+        self.endpoint = endpoint
+        self.start = start
+        self.end = end
+
+    def span(self):
+        """Calculate the angle between the rays."""
+        return self.end - self.start
+
+    def rays(self):
+        """Get the edges of the sector as rays."""
+        return (Ray(self.start, self.endpoint), Ray(self.end, self.endpoint))
+
+
 def project(point, offset, zoom):
     return (point - offset) * zoom
 
@@ -9,11 +9,13 @@ Copyright (C) 2015 Sam Hubbard
 
 import os
 import sys
+from multiprocessing import freeze_support
 
 from PyQt4.QtCore import *
 from PyQt4.QtGui import *
 
 from preferences import Preferences
+from plot import open_disk_cache
 from diagram import Diagram
 from window import Window
 
@@ -52,6 +54,12 @@ class Program(QObject):
             reader = QImageReader(img)
             icon.addPixmap(QPixmap(reader.read()))
         self.app.setWindowIcon(icon)
+        self.app.setApplicationName("Argand Plotter")
+
+        # Keep classifications between sessions, if there's somewhere to.
+        cache_path = self.get_cache_path()
+        if cache_path:
+            open_disk_cache(cache_path)
 
         # Initialise modules.
         if path:
@@ -147,6 +155,24 @@ class Program(QObject):
             # The application is running in the interpreter.
             return path
     
+    def get_cache_path(self):
+        """Returns the path of the classification cache database.
+
+        The directory is created if necessary.
+
+        Returns:
+            The path, or None if there is no writable cache directory.
+        """
+        directory = QDesktopServices.storageLocation(
+            QDesktopServices.CacheLocation)
+        if not directory:
+            return None
+        try:
+            os.makedirs(directory, exist_ok=True)
+        except OSError:
+            return None
+        return os.path.join(directory, "classifications.sqlite")
+
     def exec_(self):
         """Begin execution of Qt code (bar initialisation code).
 
@@ -156,6 +182,9 @@ class Program(QObject):
 
 
 if __name__ == "__main__":
+    # Worker processes started by classify_many run this script again,
+    # which in a frozen build must act as a worker, not open a window.
+    freeze_support()
     if len(sys.argv) > 1:
         program = Program(sys.argv[1])
     else:
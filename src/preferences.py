@@ -10,6 +10,7 @@ DEFAULT_STROKE = 1
 #DEFAULT_FONT_SIZE = 12  # Some day...
 DEFAULT_LABEL_AXES = True
 DEFAULT_LABEL_POINTS = False
+DEFAULT_FRAME_RATE = 60
 
 
 class Preferences:
@@ -19,6 +20,7 @@ class Preferences:
         stroke: The width in pixels of lines on the diagram.
         label_axes: Whether labels should be drawn on the axes.
         label_points: Whether points should be labelled on the diagram.
+        frame_rate: The most times per second the diagram is redrawn.
     """
 
     def __init__(self):
@@ -27,3 +29,4 @@ class Preferences:
         #self.font_size = DEFAULT_FONT_SIZE
         self.label_axes = DEFAULT_LABEL_AXES
         self.label_points = DEFAULT_LABEL_POINTS
+        self.frame_rate = DEFAULT_FRAME_RATE
@@ -0,0 +1,158 @@
+"""Raster
+
+Renders regions which can't be classified as simple shapes,
+by sampling their relation at every pixel in the viewport.
+
+Written by Sam Hubbard - samlhub@gmail.com
+Copyright (C) 2015 Sam Hubbard
+"""
+
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    import numpy
+except ImportError:
+    # Regions can't be rendered without NumPy.
+    numpy = None
+
+from abstract_syntax_tree import SyntaxParser, evaluate_array
+
+
+RASTER_AVAILABLE = numpy is not None
+TILE_SIZE = 256
+THREADS = os.cpu_count() or 1
+
+# Pool of worker threads, created when first needed.
+pool = None
+
+
+class Region:
+    """Stores a region as the set of points which satisfy a relation.
+
+    Only the equation is pickled; the tree is rebuilt when unpickled.
+
+    Attributes:
+        equation: The input string describing the relation.
+        tree: The root node of the relation's AST.
+    """
+    def __init__(self, equation, tree=None):
+        """Create a new region.
+
+        Args:
+            equation: See Region.equation.
+            tree: See Region.tree. If not given, the equation is parsed.
+        """
+        self.equation = equation
+        self.tree = tree or SyntaxParser(equation).get_tree()
+
+    def __getstate__(self):
+        return {"equation": self.equation}
+
+    def __setstate__(self, state):
+        self.__init__(state["equation"])
+
+    def contains(self, values):
+        """Test whether points lie in the region.
+
+        Args:
+            values: A NumPy array of complex numbers.
+
+        Returns:
+            A boolean array, which is true for points in the region.
+        """
+        return evaluate_array(self.tree, values)
+
+
+def rasterize(region, width, height, origin, zoom, parallel=True):
+    """Sample a region at the center of every pixel in a grid.
+
+    The grid is split into square tiles of TILE_SIZE pixels, which are
+    evaluated on a pool of threads. NumPy releases the interpreter lock
+    for most array operations, so the tiles are evaluated in parallel.
+
+    Args:
+        region: The region to sample.
+        width: The width of the grid in pixels.
+        height: The height of the grid in pixels.
+        origin: The point at the corner of pixel (0, 0).
+        zoom: The number of pixels per unit.
+        parallel: Whether to evaluate the tiles on the thread pool.
+
+    Returns:
+        A boolean array of shape (height, width). Element [i, j] is true
+        if the center of the pixel in row i and column j is in the region.
+    """
+    global pool
+
+    mask = numpy.zeros((height, width), bool)
+    xs = origin.x + (numpy.arange(width) + 0.5) / zoom
+    ys = origin.y + (numpy.arange(height) + 0.5) / zoom
+
+    def render_tile(corner):
+        """Sample the tile with its top left pixel at corner."""
+        i, j = corner
+        values = xs[None, j:j + TILE_SIZE] + 1j * ys[i:i + TILE_SIZE, None]
+        mask[i:i + TILE_SIZE, j:j + TILE_SIZE] = region.contains(values)
+
+    tiles = [
+        (i, j)
+        for i in range(0, height, TILE_SIZE)
+        for j in range(0, width, TILE_SIZE)]
+    if parallel and THREADS > 1 and len(tiles) > 1:
+        if not pool:
+            pool = ThreadPoolExecutor(THREADS)
+        # Wait for every tile, re-raising any exceptions.
+        list(pool.map(render_tile, tiles))
+    else:
+        for tile in tiles:
+            render_tile(tile)
+    return mask
+
+
+def rasterize_tiles(region, origins, size, zoom, parallel=True):
+    """Sample a region over several square grids of pixels.
+
+    Each grid is sampled as by rasterize, and the grids are evaluated
+    in parallel on the same pool of threads.
+
+    Args:
+        region: The region to sample.
+        origins: A list of the points at the corners of pixel (0, 0)
+            of each grid.
+        size: The width and height of each grid in pixels.
+        zoom: The number of pixels per unit.
+        parallel: Whether to evaluate the grids on the thread pool.
+
+    Returns:
+        A list of boolean arrays of shape (size, size), as returned by
+        rasterize, in the same order as the origins.
+    """
+    global pool
+
+    def render_grid(origin):
+        """Sample the grid with its corner at origin."""
+        return rasterize(region, size, size, origin, zoom, parallel=False)
+
+    if parallel and THREADS > 1 and len(origins) > 1:
+        if not pool:
+            pool = ThreadPoolExecutor(THREADS)
+        return list(pool.map(render_grid, origins))
+    return [render_grid(origin) for origin in origins]
+
+
+def colorize(mask, color):
+    """Convert a mask into 32-bit ARGB pixel data.
+
+    Args:
+        mask: A boolean array from rasterize.
+        color: A (red, green, blue, alpha) tuple of 0-255 integers.
+
+    Returns:
+        Bytes containing a pixel of the color wherever the mask is true,
+        and a transparent pixel everywhere else. Pixels are stored in
+        native byte order, as expected by QImage.Format_ARGB32.
+    """
+    r, g, b, a = color
+    argb = numpy.uint32((a << 24) | (r << 16) | (g << 8) | b)
+    return numpy.where(mask, argb, numpy.uint32(0)).tobytes()
@@ -14,13 +14,36 @@ from PyQt4.QtCore import *
 
 from plot import *
 from geometry import *
+from raster import rasterize_tiles, colorize, TILE_SIZE
+from contour import trace_tiles, split_polylines
+from cache import LRUCache
+from spatial_index import GridIndex
 from utils import clamp, floor_to
 
 
 CLING_THRES = 10
 LABEL_PAD = 20
 TICK_SIZE = 2
-DISK_DETAIL = 200
+# Offset in pixels of point labels from their points.
+POINT_LABEL_OFFSET = 3
+# Half the width in pixels of the crosses marking points.
+MARKER_SIZE = 1.5
+# Margin in pixels around the view within which plots are still drawn,
+# so that strokes and point labels aren't cut off at the edges.
+CULL_MARGIN = 200
+
+# Plots which are drawn as tiles of pixels, kept in the tile cache.
+TILED_TYPES = [TYPE_REGION, TYPE_CONTOUR]
+# The most bytes of pixel data to keep in the tile cache.
+TILE_CACHE_SIZE = 64 * 2 ** 20
+# The number of bytes of pixel data in a tile.
+TILE_BYTES = 4 * TILE_SIZE * TILE_SIZE
+
+# Plots whose items depend on the visible area, so must be redrawn
+# whenever the view is panned or zoomed.
+VIEW_DEPENDENT_TYPES = [
+    TYPE_NEGATIVE_DISK, TYPE_LINE, TYPE_HALF_PLANE, TYPE_RAY, TYPE_DUAL_RAY,
+    TYPE_SECTOR, TYPE_REGION, TYPE_CONTOUR, TYPE_PLANE]
 
 
 class FlippedText(QGraphicsTextItem):
@@ -29,7 +52,7 @@ class FlippedText(QGraphicsTextItem):
     This is needed for using a properly oriented Cartesian
     coordinate system with QGraphicsScene, unfortunately.
     """
-    def __init__(self, text, x, y):
+    def __init__(self, text="", x=0, y=0):
         """Create the text item.
         
         Args:
@@ -39,6 +62,16 @@ class FlippedText(QGraphicsTextItem):
         """
         super(FlippedText, self).__init__()
         self.setPos(x, y)
+        self.set_text(text)
+
+    def set_text(self, text):
+        """Change the text, keeping it flipped about its center.
+
+        Args:
+            text: The text to be displayed.
+        """
+        if text == self.toPlainText():
+            return
         self.setPlainText(text)
         h_width = self.boundingRect().width() / 2
         h_height = self.boundingRect().height() / 2
@@ -49,11 +82,279 @@ class FlippedText(QGraphicsTextItem):
         self.setTransform(transform)
 
 
+class Label(QGraphicsTextItem):
+    """Text labelling a point in the complex plane.
+
+    The label ignores the view's transformations, so it is drawn
+    upright and at the same size at any zoom, just above and to the
+    right of its position.
+    """
+    def __init__(self):
+        """Create the text item."""
+        super(Label, self).__init__()
+        self.setFlag(QGraphicsItem.ItemIgnoresTransformations)
+
+    def set_text(self, text):
+        """Change the text, keeping it beside its position.
+
+        Args:
+            text: The text to be displayed.
+        """
+        if text == self.toPlainText():
+            return
+        self.setPlainText(text)
+        # The item's own coordinates aren't flipped, so y is downwards.
+        self.setTransform(QTransform.fromTranslate(
+            POINT_LABEL_OFFSET,
+            POINT_LABEL_OFFSET - self.boundingRect().height()))
+
+
+class Marker(QGraphicsPathItem):
+    """A cross marking a point in the complex plane.
+
+    The cross ignores the view's transformations, so it is the same
+    size at any zoom.
+    """
+    def __init__(self):
+        """Create the cross."""
+        super(Marker, self).__init__()
+        self.setFlag(QGraphicsItem.ItemIgnoresTransformations)
+        path = QPainterPath()
+        path.moveTo(-MARKER_SIZE, -MARKER_SIZE)
+        path.lineTo(MARKER_SIZE, MARKER_SIZE)
+        path.moveTo(-MARKER_SIZE, MARKER_SIZE)
+        path.lineTo(MARKER_SIZE, -MARKER_SIZE)
+        self.setPath(path)
+
+
+class WorldItem(QGraphicsItem):
+    """An empty item whose transform maps the complex plane onto the
+    scene.
+
+    Plots are drawn as its children, in the coordinates of the complex
+    plane, so panning and zooming only has to change its transform.
+    """
+    def __init__(self):
+        """Create the item."""
+        super(WorldItem, self).__init__()
+        self.setFlag(QGraphicsItem.ItemHasNoContents)
+
+    def boundingRect(self):
+        return QRectF()
+
+    def paint(self, painter, option, widget=None):
+        pass
+
+
+class ItemPool:
+    """A set of graphics items which are kept between redraws.
+
+    Each redraw starts with ItemPool.begin. The drawing methods then
+    update the next unused item of the right kind in place, and only
+    create an item when there aren't enough. ItemPool.end hides any
+    items left unused, rather than destroying them, so that redrawing
+    an unchanged diagram doesn't allocate any Qt objects.
+
+    Attributes:
+        scene: The scene the items belong to.
+        parent: The item the items are children of, or None if they
+            are drawn in scene coordinates.
+        z: The stacking order of the items in the scene, or among the
+            children of the parent.
+        items: Maps each class of item to a list of the items.
+        used: Maps each class of item to the number used so far in the
+            current redraw.
+        owner: An object identifying what the items draw, such as the
+            Classification of a plot. See ItemPool.claim.
+        appearance: An object identifying the style the items were last
+            drawn with, or None if they haven't been drawn.
+    """
+    def __init__(self, scene, parent=None, z=0):
+        """Create an empty pool.
+
+        Args:
+            scene: See ItemPool.scene.
+            parent: See ItemPool.parent.
+            z: See ItemPool.z.
+        """
+        self.scene = scene
+        self.parent = parent
+        self.z = z
+        self.items = {}
+        self.used = {}
+        self.owner = None
+        self.appearance = None
+
+    def claim(self, owner, z):
+        """Prepare the pool to draw something.
+
+        If the pool last drew something else, its items are removed,
+        so that they are created again in the right stacking order.
+
+        Args:
+            owner: See ItemPool.owner.
+            z: See ItemPool.z.
+        """
+        if owner is not self.owner:
+            self.clear()
+            self.owner = owner
+        self.z = z
+
+    def begin(self):
+        """Start a redraw, marking every item as unused."""
+        self.used = {}
+
+    def end(self):
+        """Finish a redraw, hiding the items which weren't used."""
+        for kind, items in self.items.items():
+            for item in items[self.used.get(kind, 0):]:
+                if item.isVisible():
+                    item.setVisible(False)
+
+    def hide(self):
+        """Hide every item, keeping them to be drawn again."""
+        self.begin()
+        self.end()
+        self.appearance = None
+
+    def clear(self):
+        """Remove every item from the scene."""
+        for items in self.items.values():
+            for item in items:
+                self.scene.removeItem(item)
+        self.items = {}
+        self.used = {}
+        self.appearance = None
+
+    def take(self, kind):
+        """Get the next unused item of a class, creating it if needed.
+
+        Args:
+            kind: The class of graphics item.
+
+        Returns:
+            A visible item of the class, in the scene.
+        """
+        items = self.items.setdefault(kind, [])
+        index = self.used.get(kind, 0)
+        self.used[kind] = index + 1
+        if index < len(items):
+            item = items[index]
+            if not item.isVisible():
+                item.setVisible(True)
+        else:
+            item = kind()
+            if self.parent:
+                item.setParentItem(self.parent)
+            else:
+                self.scene.addItem(item)
+            items.append(item)
+        if item.zValue() != self.z:
+            item.setZValue(self.z)
+        return item
+
+    def style(self, item, pen=None, brush=None):
+        """Set the pen and brush of a shape item, if they've changed."""
+        pen = pen or QPen()
+        if item.pen() != pen:
+            item.setPen(pen)
+        if brush is not None and item.brush() != brush:
+            item.setBrush(brush)
+
+    def line(self, x1, y1, x2, y2, pen=None):
+        """Draw a line, like QGraphicsScene.addLine."""
+        item = self.take(QGraphicsLineItem)
+        item.setLine(x1, y1, x2, y2)
+        self.style(item, pen)
+        return item
+
+    def ellipse(self, x, y, width, height, pen=None, brush=None):
+        """Draw an ellipse, like QGraphicsScene.addEllipse."""
+        item = self.take(QGraphicsEllipseItem)
+        item.setRect(x, y, width, height)
+        self.style(item, pen, brush or QBrush())
+        return item
+
+    def polygon(self, polygon, pen=None, brush=None):
+        """Draw a polygon, like QGraphicsScene.addPolygon."""
+        item = self.take(QGraphicsPolygonItem)
+        item.setPolygon(polygon)
+        self.style(item, pen, brush or QBrush())
+        return item
+
+    def path(self, path, pen=None, brush=None):
+        """Draw a path, like QGraphicsScene.addPath."""
+        item = self.take(QGraphicsPathItem)
+        item.setPath(path)
+        self.style(item, pen, brush or QBrush())
+        return item
+
+    def pixmap(self, pixmap, x=0, y=0, scale=1):
+        """Draw a pixmap, like QGraphicsScene.addPixmap.
+
+        Args:
+            pixmap: The QPixmap to draw.
+            x: The x coordinate of the pixmap's first pixel.
+            y: The y coordinate of the pixmap's first pixel.
+            scale: The size of each pixel.
+        """
+        item = self.take(QGraphicsPixmapItem)
+        if item.pixmap().cacheKey() != pixmap.cacheKey():
+            item.setPixmap(pixmap)
+        item.setPos(x, y)
+        item.setTransform(QTransform.fromScale(scale, scale))
+        return item
+
+    def marker(self, x, y, pen=None):
+        """Mark a point with a cross, as a Marker item."""
+        item = self.take(Marker)
+        item.setPos(x, y)
+        self.style(item, pen)
+        return item
+
+    def label(self, text, x, y):
+        """Label a point, as a Label item."""
+        item = self.take(Label)
+        item.setPos(x, y)
+        item.set_text(text)
+        return item
+
+    def text(self, text, x, y):
+        """Draw vertically flipped text, as a FlippedText item."""
+        item = self.take(FlippedText)
+        item.setPos(x, y)
+        item.set_text(text)
+        return item
+
+
 class SceneDiagram(QGraphicsScene):
     """Implementation of QGraphicsScene for drawing diagrams.
     
+    The scene is retained between redraws: the axes and each plot own
+    an ItemPool, whose items are updated in place. The axes are drawn
+    in scene coordinates, which are pixels from the bottom left of the
+    view. Plots are drawn in the coordinates of the complex plane.
+
+    Plots are kept in a spatial index by their bounding boxes, so only
+    the plots near the visible area are drawn. The items of the others
+    are hidden until they come back into view.
+
+    Regions and contours are drawn as square tiles of pixels, aligned
+    to a grid in the complex plane for each zoom level. Tiles are kept
+    in an LRUCache, so panning over them again only moves pixmaps.
+
     Attributes:
         program: Reference to the program object.
+        axes: The ItemPool of the axes and their labels.
+        world: The WorldItem which the plots are drawn in.
+        plot_items: Maps each plot in the diagram to its ItemPool.
+        dependent: Maps the plots whose items depend on the visible
+            area to their ItemPools.
+        index: GridIndex of the plots, by Classification.bounds.
+        visible: The set of plots drawn at the last redraw.
+        tiles: LRUCache of QPixmap tiles, weighted by their size in
+            bytes. Keyed by the ItemPool of the plot, its style, the
+            zoom and the column and row of the tile.
     """
     def __init__(self, program):
         """Create the scene.
@@ -64,6 +365,16 @@ class SceneDiagram(QGraphicsScene):
         super(SceneDiagram, self).__init__()
         self.program = program
         self.setItemIndexMethod(QGraphicsScene.NoIndex)
+        self.axes = ItemPool(self)
+        self.world = WorldItem()
+        # Plots are drawn on top of the axes.
+        self.world.setZValue(1)
+        self.addItem(self.world)
+        self.plot_items = {}
+        self.dependent = {}
+        self.index = GridIndex()
+        self.visible = set()
+        self.tiles = LRUCache(TILE_CACHE_SIZE)
 
     def draw_axes(self):
         """Draws the real and imaginary axes.
@@ -82,6 +393,9 @@ class SceneDiagram(QGraphicsScene):
         zoom = self.program.diagram.zoom
         origin = -translation * zoom
 
+        items = self.axes
+        items.begin()
+
         # Clamp coordinates so the axes cling to the edge of the screen.
         cling_x = clamp(
             origin.x,
@@ -95,22 +409,22 @@ class SceneDiagram(QGraphicsScene):
         )
 
         # Draw the axes.
-        self.addLine(width / 2 + cling_x, 0, width / 2 + cling_x, height)
-        self.addLine(0, height / 2 + cling_y, width, height / 2 + cling_y)
+        items.line(width / 2 + cling_x, 0, width / 2 + cling_x, height)
+        items.line(0, height / 2 + cling_y, width, height / 2 + cling_y)
 
         # If enabled, label the axes.
         if self.program.preferences.label_axes:
             # Draw the Re and Im labels.
-            self.addItem(FlippedText(
+            items.text(
                 "Re",
                 width - LABEL_PAD,
                 height / 2 + cling_y - 2 * CLING_THRES
-            ))
-            self.addItem(FlippedText(
+            )
+            items.text(
                 "Im",
                 width / 2 + cling_x - 2 * CLING_THRES,
                 height - LABEL_PAD
-            ))
+            )
 
             # Set the step using the order of magnitude of the current zoom.
             step = 10 ** floor_to(2 - log10(zoom), log10(5))
@@ -124,11 +438,11 @@ class SceneDiagram(QGraphicsScene):
                 global_tick = (screen_tick - origin.x) / zoom
                 if abs(global_tick) < 10**-10:  # Floats aren't perfect.
                     continue
-                self.addItem(FlippedText(
+                items.text(
                     "{:n}".format(global_tick),
                     width / 2 + screen_tick,
-                    height / 2 + cling_y))
-                self.addLine(
+                    height / 2 + cling_y)
+                items.line(
                     width / 2 + screen_tick,
                     height / 2 + cling_y + TICK_SIZE,
                     width / 2 + screen_tick,
@@ -141,11 +455,11 @@ class SceneDiagram(QGraphicsScene):
                 global_tick = (screen_tick - origin.y) / zoom
                 if abs(global_tick) < 10**-10:
                     continue
-                self.addItem(FlippedText(
+                items.text(
                     "{:n}".format(global_tick),
                     width / 2 + cling_x,
-                    height / 2 + screen_tick))
-                self.addLine(
+                    height / 2 + screen_tick)
+                items.line(
                     width / 2 + cling_x + TICK_SIZE,
                     height / 2 + screen_tick,
                     width / 2 + cling_x - TICK_SIZE,
@@ -153,188 +467,439 @@ class SceneDiagram(QGraphicsScene):
 
             # Only label origin if it is actually in viewport (not clinging).
             if cling_x - origin.x == 0 and cling_y - origin.y == 0:
-                self.addItem(FlippedText(
+                items.text(
                     "0",
                     width / 2 + cling_x,
-                    height / 2 + cling_y))
+                    height / 2 + cling_y)
+        items.end()
 
     def draw_plots(self):
-        """Draw all the plots to the scene."""
+        """Draw all the plots to the scene.
+
+        Plots are drawn in the coordinates of the complex plane, as
+        children of SceneDiagram.world. The spatial index is first
+        brought up to date with the list of plots, then the plots are
+        drawn with SceneDiagram.draw_visible.
+
+        The items of plots which have been removed, or can no longer be
+        drawn, are removed.
+        """
+        pools = {}
+        self.dependent = {}
+        for i in range(self.program.diagram.plots.rowCount()):
+            plot = self.program.diagram.plots.item(i)
+            if not plot.classification:
+                continue
+            items = self.plot_items.pop(plot, None) \
+                or ItemPool(self, self.world)
+            pools[plot] = items
+            if items.owner is not plot.classification:
+                self.index.insert(plot, plot.classification.bounds)
+                self.invalidate_tiles(items)
+            # Later plots are drawn on top of earlier ones.
+            items.claim(plot.classification, i)
+            if plot.classification.type in VIEW_DEPENDENT_TYPES:
+                self.dependent[plot] = items
+
+        for plot, items in self.plot_items.items():
+            self.invalidate_tiles(items)
+            items.clear()
+            self.index.remove(plot)
+            self.visible.discard(plot)
+        self.plot_items = pools
+        self.draw_visible()
+
+    def draw_view(self):
+        """Redraw the scene after it has been panned, zoomed or resized.
+
+        Only the axes and the plots which are near the visible area are
+        considered. Of these, only the plots which depend on the visible
+        area or have just come into view are redrawn. Other plots are
+        moved by the world item's transform.
+        """
+        self.draw_axes()
+        for plot in self.visible:
+            if self.plot_items[plot].owner is not plot.classification:
+                # A plot has changed since the last full redraw.
+                self.draw_plots()
+                return
+        self.draw_visible()
+
+    def draw_visible(self):
+        """Draw the plots near the visible area, and hide the rest.
+
+        Plots are redrawn if they depend on the visible area, have just
+        come into view, or their style or stacking order has changed.
+        Plots which have left the view are hidden.
+        """
+        self.update_transform()
+        bounds = self.visible_bounds()
+        stroke = self.program.preferences.stroke
+        label_points = self.program.preferences.label_points
+
+        margin = CULL_MARGIN / self.program.diagram.zoom
+        left, bottom, right, top = bounds
+        visible = self.index.query(
+            (left - margin, bottom - margin, right + margin, top + margin))
+        for plot in self.visible - visible:
+            self.plot_items[plot].hide()
+        for plot in visible:
+            items = self.plot_items[plot]
+            color = plot.data(ROLE_COLOR)
+            style = (color.rgba(), stroke, label_points, items.z)
+            if items.appearance not in [None, style]:
+                self.invalidate_tiles(items)
+            if plot in self.dependent or items.appearance != style:
+                self.draw_plot(items, plot.classification, color, bounds)
+                items.appearance = style
+        self.visible = visible
+
+    def invalidate_tiles(self, items):
+        """Remove a plot's tiles from the tile cache.
+
+        Tiles are also keyed by the style of the plot, so they are never
+        drawn once out of date. They are removed to free their memory.
+
+        Args:
+            items: The ItemPool of the plot, which still has the plot's
+                old Classification as its owner.
+        """
+        if items.owner is None or items.owner.type not in TILED_TYPES:
+            return
+        for key in [key for key in self.tiles.entries if key[0] is items]:
+            self.tiles.discard(key)
+
+    def update_transform(self):
+        """Map the complex plane onto the scene for the current view."""
         width = self.sceneRect().width()
         height = self.sceneRect().height()
-        center = Point(width / 2, height / 2)
+        offset = self.program.diagram.translation
+        zoom = self.program.diagram.zoom
+        self.world.setTransform(QTransform(
+            zoom, 0, 0, zoom,
+            width / 2 - offset.x * zoom, height / 2 - offset.y * zoom))
+
+    def visible_bounds(self):
+        """Find the area of the complex plane which is visible.
 
+        Returns:
+            A (left, bottom, right, top) tuple of the edges of the
+            visible area, with a margin of a pixel.
+        """
+        width = self.sceneRect().width()
+        height = self.sceneRect().height()
         offset = self.program.diagram.translation
         zoom = self.program.diagram.zoom
-        stroke = self.program.preferences.stroke
+        half_width = (width / 2 + 1) / zoom
+        half_height = (height / 2 + 1) / zoom
+        return (offset.x - half_width, offset.y - half_height,
+                offset.x + half_width, offset.y + half_height)
 
-        for i in range(self.program.diagram.plots.rowCount()):
-            plot = self.program.diagram.plots.item(i)
-            type = plot.data(ROLE_TYPE)
-            relation = plot.data(ROLE_RELATION)
-            shape = plot.data(ROLE_SHAPE)
-            fill_color = plot.data(ROLE_COLOR)
-            stroke_color = QColor(fill_color)
-            stroke_color.setAlpha(255)
-
-            pen = QPen(stroke_color)
-            pen.setWidth(stroke)
-            if relation in [REL_LESS, REL_MORE]:
-                pen.setStyle(Qt.DashLine)
-
-            brush = QBrush(fill_color)
-            
-            if isinstance(shape, Point) and type == TYPE_POINT:
-                # Draw the point as a cross.
-                p = project(shape, offset, zoom)
-                pen.setWidth(1)
-                self.addLine(
-                    center.x + p.x - 1.5, center.y + p.y - 1.5,
-                    center.x + p.x + 1.5, center.y + p.y + 1.5, pen)
-                self.addLine(
-                    center.x + p.x - 1.5, center.y + p.y + 1.5,
-                    center.x + p.x + 1.5, center.y + p.y - 1.5, pen)
-
-                # Label the point if set in preferences.
-                if self.program.preferences.label_points:
-                    if shape.x == 0:
-                        if shape.y == 0:
-                            text = "0"
-                        else:
-                            text = "{:n}j".format(shape.y)
+    def draw_plot(self, items, classification, fill_color, bounds):
+        """Draw a plot in the coordinates of the complex plane.
+
+        Args:
+            items: The plot's ItemPool.
+            classification: The plot's Classification.
+            fill_color: The colour to fill the plot with.
+            bounds: The visible area, from SceneDiagram.visible_bounds.
+        """
+        left, bottom, right, top = bounds
+        type = classification.type
+        relation = classification.relation
+        shape = classification.shape
+        stroke_color = QColor(fill_color)
+        stroke_color.setAlpha(255)
+
+        # Pens are cosmetic, so their width is in pixels at any zoom.
+        pen = QPen(stroke_color)
+        pen.setWidth(self.program.preferences.stroke)
+        pen.setCosmetic(True)
+        if relation in [REL_LESS, REL_MORE]:
+            pen.setStyle(Qt.DashLine)
+
+        brush = QBrush(fill_color)
+        no_pen = QPen(Qt.NoPen)
+
+        items.begin()
+
+        if type == TYPE_PLANE:
+            # Fill the whole visible area.
+            path = QPainterPath()
+            path.addRect(QRectF(left, bottom, right - left, top - bottom))
+            items.path(path, no_pen, brush)
+
+        if isinstance(shape, Point) and type == TYPE_POINT:
+            # Draw the point as a cross.
+            pen.setWidth(1)
+            items.marker(shape.x, shape.y, pen)
+
+            # Label the point if set in preferences.
+            if self.program.preferences.label_points:
+                if shape.x == 0:
+                    if shape.y == 0:
+                        text = "0"
                     else:
-                        if shape.y == 0:
-                            text = "{:n}".format(shape.x)
-                        else:
-                            text = "{:n}{:+n}j".format(shape.x, shape.y)
-                    self.addItem(FlippedText(
-                        text,
-                        center.x + p.x + 3,
-                        center.y + p.y - 3))
-
-            if isinstance(shape, Circle):
-                p = project(shape.origin(), offset, zoom)
-                if type == TYPE_CIRCLE:
-                    self.addEllipse(
-                        center.x + p.x, center.y + p.y,
-                        shape.diameter() * zoom, shape.diameter() * zoom, pen)
-
-                if type == TYPE_DISK:
-                    self.addEllipse(
-                        center.x + p.x, center.y + p.y,
-                        shape.diameter() * zoom, shape.diameter() * zoom,
-                        pen, brush)
-
-                if type == TYPE_NEGATIVE_DISK:
-                    # Tricky part - construct a polygon to fill the screen.
-                    polygon = QPolygonF()
-                    polygon.append(QPointF(-1, -1))
-                    polygon.append(QPointF(width + 1, -1))
-                    polygon.append(QPointF(width + 1, height + 1))
-                    polygon.append(QPointF(-1, height + 1))
-                    for i in range(DISK_DETAIL + 1):
-                        theta = (i / DISK_DETAIL) * (2 * pi)
-                        p_i = center + project(
-                            shape.point(theta), offset, zoom)
-                        polygon.append(QPointF(p_i.x, p_i.y))
-                    polygon.append(QPointF(-1, height + 1))
-                    self.addPolygon(polygon, QPen(Qt.NoPen), brush)
-
-                    # Easy part - draw the edge of the disk.
-                    self.addEllipse(
-                        center.x + p.x, center.y + p.y,
-                        shape.diameter() * zoom, shape.diameter() * zoom, pen)
-
-            if isinstance(shape, Line):
-                if abs(shape.gradient) <= 1:
-                    left = Line(float("inf"), -center.x / zoom + offset.x)
-                    right = Line(float("inf"), center.x / zoom + offset.x)
-                    p0 = shape.intersect(left)
-                    p1 = shape.intersect(right)
+                        text = "{:n}j".format(shape.y)
                 else:
-                    bottom = Line(0, -center.y / zoom + offset.y)
-                    top = Line(0, center.y / zoom + offset.y)
-                    p0 = shape.intersect(bottom)
-                    p1 = shape.intersect(top)
-                q0 = project(p0, offset, zoom)
-                q1 = project(p1, offset, zoom)
-
-                if type == TYPE_LINE:
-                    self.addLine(
-                        center.x + q0.x, center.y + q0.y,
-                        center.x + q1.x, center.y + q1.y, pen)
-
-                if type == TYPE_HALF_PLANE:
-                    # Construct a polygon.
-                    polygon = QPolygonF()
-                    polygon.append(QPointF(center.x + q0.x, center.y + q0.y))
-                    polygon.append(QPointF(center.x + q1.x, center.y + q1.y))
-                    above = bool(shape.side & ABOVE) * 2 - 1
-                    right = bool(shape.side & RIGHT) * 2 - 1
-                    if abs(shape.gradient) <= 1:
-                        polygon.append(QPointF(
-                            center.x + q1.x + 1,
-                            center.y + (height/2 + 1) * above))
-                        polygon.append(QPointF(
-                            center.x + q0.x - 1,
-                            center.y + (height/2 + 1) * above))
+                    if shape.y == 0:
+                        text = "{:n}".format(shape.x)
                     else:
-                        polygon.append(QPointF(
-                            center.x + (width/2 + 1) * right,
-                            center.y + q1.y + 1))
-                        polygon.append(QPointF(
-                            center.x + (width/2 + 1) * right,
-                            center.y + q0.y - 1))
-                    self.addPolygon(polygon, QPen(Qt.NoPen), brush)
-
-                    # Draw the edge.
-                    self.addLine(
-                        center.x + q0.x, center.y + q0.y,
-                        center.x + q1.x, center.y + q1.y, pen)
-
-
-            if isinstance(shape, Ray) or isinstance(shape, DualRay):            
-                def find_intersections(ray, near, far):
-                    """Try to intersect a ray with edges of the screen. If the
-                       endpoint is on-screen, return it as an intersection.
-                    """
-                    p0 = ray.intersect(near)
-                    p1 = ray.intersect(far)
-                    if not p0 or not p1:
-                        if not p0:
-                            p0 = ray.endpoint
-                        elif not p1:
-                            p1 = ray.endpoint
-                        else:
-                            return None
-                    return (p0, p1)
-
-                def draw_ray(ray):
-                    left = Line(float("inf"), -center.x / zoom + offset.x)
-                    right = Line(float("inf"), center.x / zoom + offset.x)
-                    bottom = Line(0, -center.y / zoom + offset.y)
-                    top = Line(0, center.y / zoom + offset.y)
-                    if pi / 4 <= ray.angle % pi < 3 * pi / 4:
-                        points = find_intersections(ray, bottom, top)
+                        text = "{:n}{:+n}j".format(shape.x, shape.y)
+                items.label(text, shape.x, shape.y)
+
+        if isinstance(shape, Circle):
+            p = shape.origin()
+            if type == TYPE_CIRCLE:
+                items.ellipse(
+                    p.x, p.y, shape.diameter(), shape.diameter(), pen)
+
+            if type == TYPE_DISK:
+                items.ellipse(
+                    p.x, p.y, shape.diameter(), shape.diameter(),
+                    pen, brush)
+
+            if type == TYPE_NEGATIVE_DISK:
+                # Cut the disk out of the visible area.
+                path = QPainterPath()
+                path.setFillRule(Qt.OddEvenFill)
+                path.addRect(QRectF(left, bottom, right - left, top - bottom))
+                path.addEllipse(
+                    p.x, p.y, shape.diameter(), shape.diameter())
+                items.path(path, no_pen, brush)
+
+                # Draw the edge of the disk.
+                items.ellipse(
+                    p.x, p.y, shape.diameter(), shape.diameter(), pen)
+
+        if isinstance(shape, Line):
+            if abs(shape.gradient) <= 1:
+                p0 = shape.intersect(Line(float("inf"), left))
+                p1 = shape.intersect(Line(float("inf"), right))
+            else:
+                p0 = shape.intersect(Line(0, bottom))
+                p1 = shape.intersect(Line(0, top))
+
+            if type == TYPE_LINE:
+                items.line(p0.x, p0.y, p1.x, p1.y, pen)
+
+            if type == TYPE_HALF_PLANE:
+                # Construct a polygon reaching the edge of the visible area.
+                polygon = QPolygonF()
+                polygon.append(QPointF(p0.x, p0.y))
+                polygon.append(QPointF(p1.x, p1.y))
+                if abs(shape.gradient) <= 1:
+                    edge = top if shape.side & ABOVE else bottom
+                    polygon.append(QPointF(p1.x, edge))
+                    polygon.append(QPointF(p0.x, edge))
+                else:
+                    edge = right if shape.side & RIGHT else left
+                    polygon.append(QPointF(edge, p1.y))
+                    polygon.append(QPointF(edge, p0.y))
+                items.polygon(polygon, no_pen, brush)
+
+                # Draw the edge.
+                items.line(p0.x, p0.y, p1.x, p1.y, pen)
+
+        if isinstance(shape, Ray) or isinstance(shape, DualRay):
+            def find_intersections(ray, near, far):
+                """Try to intersect a ray with edges of the screen. If the
+                   endpoint is on-screen, return it as an intersection.
+                """
+                p0 = ray.intersect(near)
+                p1 = ray.intersect(far)
+                if not p0 or not p1:
+                    if not p0:
+                        p0 = ray.endpoint
+                    elif not p1:
+                        p1 = ray.endpoint
                     else:
-                        points = find_intersections(ray, left, right)
-                    if not points[0] or not points[1]:
-                        return
-                    self.addLine(
-                        center.x + (points[0].x - offset.x) * zoom,
-                        center.y + (points[0].y - offset.y) * zoom,
-                        center.x + (points[1].x - offset.x) * zoom,
-                        center.y + (points[1].y - offset.y) * zoom, pen)
-
-                if type == TYPE_RAY:
-                    draw_ray(shape)
-
-                if type == TYPE_DUAL_RAY:
-                    for ray in shape.rays:
-                        draw_ray(ray)
-
-                if type == TYPE_SECTOR:
-                    pass
+                        return None
+                return (p0, p1)
+
+            def draw_ray(ray):
+                if pi / 4 <= ray.angle % pi < 3 * pi / 4:
+                    points = find_intersections(
+                        ray, Line(0, bottom), Line(0, top))
+                else:
+                    points = find_intersections(
+                        ray, Line(float("inf"), left),
+                        Line(float("inf"), right))
+                if not points[0] or not points[1]:
+                    return
+                items.line(
+                    points[0].x, points[0].y, points[1].x, points[1].y, pen)
+
+            if type == TYPE_RAY:
+                draw_ray(shape)
+
+            if type == TYPE_DUAL_RAY:
+                for ray in shape.rays:
+                    draw_ray(ray)
+
+        if isinstance(shape, Sector) and type == TYPE_SECTOR:
+            self.draw_sector(items, shape, pen, brush, bounds)
+
+        if isinstance(shape, Annulus) and type == TYPE_ANNULUS:
+            # The inner disk is cut out of the outer one.
+            path = QPainterPath()
+            path.setFillRule(Qt.OddEvenFill)
+            for circle in [shape.outer_circle(), shape.inner_circle()]:
+                p = circle.origin()
+                path.addEllipse(
+                    p.x, p.y, circle.diameter(), circle.diameter())
+            items.path(path, pen, brush)
+
+        if isinstance(shape, Region) and type == TYPE_REGION:
+            self.draw_region(items, shape, fill_color)
+
+        if isinstance(shape, Contour) and type == TYPE_CONTOUR:
+            self.draw_contour(items, shape, pen)
+
+        items.end()
+
+    def draw_sector(self, items, sector, pen, brush, bounds):
+        """Draw a sector, clipped to the visible area.
+
+        The sector is filled as a pie slice of a circle which covers the
+        whole visible area, intersected with it.
+
+        Args:
+            items: The ItemPool to draw with.
+            sector: The sector to draw.
+            pen: The pen to draw the edges with.
+            brush: The brush to fill the sector with.
+            bounds: The visible area, from SceneDiagram.visible_bounds.
+        """
+        left, bottom, right, top = bounds
+        p = sector.endpoint
+        # The furthest corner of the visible area from the endpoint.
+        radius = hypot(max(p.x - left, right - p.x),
+                       max(p.y - bottom, top - p.y))
+        edges = [p + Point(cos(angle), sin(angle)) * radius
+                 for angle in [sector.start, sector.end]]
+
+        # Angles in Qt are clockwise in these coordinates, since the
+        # view is flipped.
+        path = QPainterPath(QPointF(p.x, p.y))
+        path.arcTo(
+            QRectF(p.x - radius, p.y - radius, 2 * radius, 2 * radius),
+            -degrees(sector.start), -degrees(sector.span()))
+        path.closeSubpath()
+        visible = QPainterPath()
+        visible.addRect(QRectF(left, bottom, right - left, top - bottom))
+        items.path(path.intersected(visible), QPen(Qt.NoPen), brush)
+
+        # Draw the edges.
+        edge_path = QPainterPath(QPointF(edges[0].x, edges[0].y))
+        edge_path.lineTo(p.x, p.y)
+        edge_path.lineTo(edges[1].x, edges[1].y)
+        items.path(edge_path, pen)
+
+    def draw_tiles(self, items, style, render):
+        """Draw the tiles of a plot which cover the visible area.
+
+        Tiles are TILE_SIZE pixels square, and tile (i, j) at a zoom of
+        z has its corner at (i, j) * TILE_SIZE / z. Tiles missing from
+        the tile cache are rendered together, then cached.
+
+        Args:
+            items: The ItemPool to draw with.
+            style: An object identifying the appearance of the tiles,
+                such as their colour.
+            render: A function which takes a list of the corners of the
+                missing tiles, and returns a list of QPixmaps of them.
+        """
+        zoom = self.program.diagram.zoom
+        size = TILE_SIZE / zoom
+        left, bottom, right, top = self.visible_bounds()
+        keys = [
+            (items, style, zoom, i, j)
+            for i in range(floor(left / size), floor(right / size) + 1)
+            for j in range(floor(bottom / size), floor(top / size) + 1)]
+
+        pixmaps = {key: self.tiles.get(key) for key in keys}
+        missing = [key for key in keys if pixmaps[key] is None]
+        if missing:
+            corners = [Point(key[3] * size, key[4] * size) for key in missing]
+            for key, pixmap in zip(missing, render(corners)):
+                pixmaps[key] = pixmap
+                self.tiles.put(key, pixmap, TILE_BYTES)
+
+        for key in keys:
+            items.pixmap(pixmaps[key], key[3] * size, key[4] * size, 1 / zoom)
+
+    def draw_region(self, items, region, color):
+        """Rasterize a region over the visible tiles and draw it.
+
+        Args:
+            items: The ItemPool to draw with.
+            region: The region to draw.
+            color: The colour to fill the region with.
+        """
+        zoom = self.program.diagram.zoom
+
+        def render(corners):
+            """Rasterize the tiles with their corners at corners."""
+            pixmaps = []
+            for mask in rasterize_tiles(region, corners, TILE_SIZE, zoom):
+                data = colorize(mask, color.getRgb())
+                # Scene y increases upwards (the view is flipped), so row
+                # i of the image covers y coordinates i / zoom to
+                # (i + 1) / zoom above the corner.
+                image = QImage(data, TILE_SIZE, TILE_SIZE, 4 * TILE_SIZE,
+                               QImage.Format_ARGB32)
+                # Copy the image so it doesn't refer to the temporary buffer.
+                pixmaps.append(QPixmap.fromImage(image.copy()))
+            return pixmaps
+
+        self.draw_tiles(items, color.rgba(), render)
+
+    def draw_contour(self, items, contour, pen):
+        """Trace a contour over the visible tiles and draw it.
+
+        The missing tiles are traced together, with a margin as wide as
+        the pen, so that strokes which cross the edges of tiles aren't
+        cut short. Each tile is then painted with the parts of the curve
+        near it.
+
+        Args:
+            items: The ItemPool to draw with.
+            contour: The contour to draw.
+            pen: The pen to draw the curve with.
+        """
+        zoom = self.program.diagram.zoom
+        margin = pen.width() + 1
+
+        def render(corners):
+            """Trace and paint the tiles with their corners at corners."""
+            polylines = trace_tiles(
+                contour, corners, TILE_SIZE, zoom, margin)
+            size = TILE_SIZE / zoom
+            tiles = split_polylines(polylines, size, margin / zoom)
+            pixmaps = []
+            for corner in corners:
+                path = QPainterPath()
+                index = (round(corner.x / size), round(corner.y / size))
+                for polyline in tiles.get(index, []):
+                    path.moveTo(polyline[0].x, polyline[0].y)
+                    for point in polyline[1:]:
+                        path.lineTo(point.x, point.y)
+                image = QImage(
+                    TILE_SIZE, TILE_SIZE, QImage.Format_ARGB32_Premultiplied)
+                image.fill(0)
+                painter = QPainter(image)
+                painter.setPen(pen)
+                # Map the complex plane onto the tile's pixels.
+                painter.setTransform(QTransform(
+                    zoom, 0, 0, zoom, -corner.x * zoom, -corner.y * zoom))
+                painter.drawPath(path)
+                painter.end()
+                pixmaps.append(QPixmap.fromImage(image))
+            return pixmaps
+
+        self.draw_tiles(
+            items, (pen.color().rgba(), pen.width()), render)
 
     def set_viewport(self, viewport):
         """Called when the size of the parent widget changes.
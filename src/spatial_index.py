@@ -0,0 +1,143 @@
+"""Spatial Index
+
+Grid of buckets for finding the shapes within an area of the complex
+plane, without testing every shape.
+
+Written by Sam Hubbard - samlhub@gmail.com
+Copyright (C) 2015 Sam Hubbard
+"""
+
+from math import floor, isfinite
+
+
+DEFAULT_CELL_SIZE = 1.0
+# Items spanning more cells than this in either direction are kept in
+# a set instead, rather than being added to every cell they cover.
+MAX_ITEM_CELLS = 16
+
+
+class GridIndex:
+    """Finds the keys whose bounding boxes intersect a rectangle.
+
+    Bounding boxes are (left, bottom, right, top) tuples. Each key is
+    added to every square cell its box overlaps, so a query only has
+    to look at the cells the rectangle overlaps. Keys with no bounding
+    box are unbounded, and are found by every query.
+
+    Attributes:
+        cell_size: The width of the cells.
+        cells: Maps (column, row) pairs to sets of keys.
+        bounds: Maps each key to its bounding box, or None.
+        large: The set of keys too large to be added to cells.
+        unbounded: The set of keys with no bounding box.
+    """
+    def __init__(self, cell_size=DEFAULT_CELL_SIZE):
+        """Create an empty index.
+
+        Args:
+            cell_size: See GridIndex.cell_size.
+        """
+        self.cell_size = cell_size
+        self.cells = {}
+        self.bounds = {}
+        self.large = set()
+        self.unbounded = set()
+
+    def __len__(self):
+        return len(self.bounds)
+
+    def __contains__(self, key):
+        return key in self.bounds
+
+    def cell_range(self, bounds):
+        """Find the cells which a bounding box overlaps.
+
+        Returns:
+            A (first column, first row, last column, last row) tuple.
+        """
+        left, bottom, right, top = bounds
+        size = self.cell_size
+        return (floor(left / size), floor(bottom / size),
+                floor(right / size), floor(top / size))
+
+    def insert(self, key, bounds):
+        """Add a key to the index, replacing any earlier bounding box.
+
+        Args:
+            key: Any hashable object.
+            bounds: The key's bounding box, or None if it's unbounded.
+        """
+        if key in self.bounds:
+            self.remove(key)
+        self.bounds[key] = bounds
+        if bounds is None:
+            self.unbounded.add(key)
+            return
+        if not all(isfinite(edge) for edge in bounds):
+            self.large.add(key)
+            return
+        i0, j0, i1, j1 = self.cell_range(bounds)
+        if i1 - i0 >= MAX_ITEM_CELLS or j1 - j0 >= MAX_ITEM_CELLS:
+            self.large.add(key)
+            return
+        for i in range(i0, i1 + 1):
+            for j in range(j0, j1 + 1):
+                self.cells.setdefault((i, j), set()).add(key)
+
+    def remove(self, key):
+        """Remove a key from the index, if it's there."""
+        bounds = self.bounds.pop(key, None)
+        if key in self.unbounded or key in self.large:
+            self.unbounded.discard(key)
+            self.large.discard(key)
+            return
+        if bounds is None:
+            return
+        i0, j0, i1, j1 = self.cell_range(bounds)
+        for i in range(i0, i1 + 1):
+            for j in range(j0, j1 + 1):
+                cell = self.cells[i, j]
+                cell.discard(key)
+                if not cell:
+                    del self.cells[i, j]
+
+    def clear(self):
+        """Remove every key from the index."""
+        self.cells = {}
+        self.bounds = {}
+        self.large = set()
+        self.unbounded = set()
+
+    def query(self, bounds):
+        """Find the keys which might be visible within a rectangle.
+
+        When the rectangle covers more cells than there are keys, or is
+        infinite, the keys are tested directly instead.
+
+        Args:
+            bounds: The rectangle, as a bounding box.
+
+        Returns:
+            The set of unbounded keys, and of keys whose bounding boxes
+            intersect the rectangle.
+        """
+        finite = all(isfinite(edge) for edge in bounds)
+        if finite:
+            i0, j0, i1, j1 = self.cell_range(bounds)
+        if not finite or (i1 - i0 + 1) * (j1 - j0 + 1) > len(self.bounds):
+            candidates = self.bounds.keys() - self.unbounded
+        else:
+            candidates = set(self.large)
+            for i in range(i0, i1 + 1):
+                for j in range(j0, j1 + 1):
+                    cell = self.cells.get((i, j))
+                    if cell:
+                        candidates |= cell
+        left, bottom, right, top = bounds
+        found = set(self.unbounded)
+        for key in candidates:
+            other = self.bounds[key]
+            if other[0] <= right and left <= other[2] \
+                    and other[1] <= top and bottom <= other[3]:
+                found.add(key)
+        return found
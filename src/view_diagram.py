@@ -17,11 +17,22 @@ from scene_diagram import SceneDiagram
 class ViewDiagram(QGraphicsView):
     """Implementation of QGraphicsView for handling a diagram QGraphicsScene.
     
+    Redraws are scheduled rather than done straight away. Requests made
+    before the next frame are coalesced into a single redraw, and frames
+    are at least 1 / Preferences.frame_rate seconds apart.
+
     Attributes:
         program: Reference to the program object.
         scene: Reference to the QGraphicsScene.
         dragging: True if the user is currently dragging over the view.
         last_pos: The last position where the mouse was down.
+        dirty: True if a redraw has been requested but not yet done.
+        dirty_plots: True if the plots must all be redrawn, rather than
+            just the parts of the scene which depend on the visible area.
+        draw_timer: Single-shot QTimer which fires at the next frame.
+        frame_clock: QElapsedTimer started at the last redraw.
+        requested_draws: The number of redraws which have been requested.
+        performed_draws: The number of redraws which have been done.
     """
     def __init__(self, program):
         """Create the view.
@@ -44,15 +55,62 @@ class ViewDiagram(QGraphicsView):
         
         self.dragging = False
         self.last_pos = Point(0, 0)
-    
+
+        self.dirty = False
+        self.dirty_plots = False
+        self.draw_timer = QTimer()
+        self.draw_timer.setSingleShot(True)
+        self.draw_timer.timeout.connect(self.draw_now)
+        self.frame_clock = QElapsedTimer()
+        self.requested_draws = 0
+        self.performed_draws = 0
+
     def draw(self):
-        """Clear the scene and signal the it to re-draw itself."""
-        self.scene.clear()
-        self.scene.draw_axes()
-        self.scene.draw_plots()
-        # Force the scene to repaint now, rather than at the end
-        # of the event queue.
-        self.viewport().repaint()
+        """Schedule the scene to re-draw itself at the next frame.
+
+        The scene updates its existing items rather than being cleared.
+        """
+        self.dirty_plots = True
+        self.schedule_draw()
+
+    def draw_view(self):
+        """Schedule the scene to re-draw itself after the view changes.
+
+        Only the parts of the scene which depend on the visible area are
+        redrawn, unless a full redraw is also pending.
+        """
+        self.schedule_draw()
+
+    def schedule_draw(self):
+        """Mark the scene as dirty, and start the timer for the next
+        frame if it isn't already running."""
+        self.requested_draws += 1
+        self.dirty = True
+        if self.draw_timer.isActive():
+            return
+        delay = 0
+        if self.frame_clock.isValid():
+            interval = 1000 // max(1, self.program.preferences.frame_rate)
+            delay = max(0, interval - self.frame_clock.elapsed())
+        self.draw_timer.start(delay)
+
+    def draw_now(self):
+        """Do any pending redraw straight away."""
+        self.draw_timer.stop()
+        if not self.dirty:
+            return
+        self.frame_clock.start()
+        if self.dirty_plots:
+            self.scene.draw_axes()
+            self.scene.draw_plots()
+        else:
+            self.scene.draw_view()
+        self.dirty = False
+        self.dirty_plots = False
+        self.performed_draws += 1
+        # Paints are queued too, so they are merged with any other
+        # updates to the viewport.
+        self.viewport().update()
 
     def mousePressEvent(self, event):
         """Start dragging when the mouse button is pressed."""
@@ -69,7 +127,7 @@ class ViewDiagram(QGraphicsView):
             self.last_pos = mouse_pos
 
             self.program.diagram.translate(-delta)
-            self.draw()
+            self.draw_view()
         super(ViewDiagram, self).mouseMoveEvent(event)
 
     def mouseReleaseEvent(self, event):
@@ -88,10 +146,10 @@ class ViewDiagram(QGraphicsView):
             zoom /= 1.2
             delta += 120
         self.program.diagram.set_zoom(zoom)
-        self.draw()
+        self.draw_view()
         super(ViewDiagram, self).wheelEvent(event)
         
     def resizeEvent(self, event):
         """Resize the viewport when the window is resized."""
         self.scene.set_viewport(self.viewport())
-        self.draw()
+        self.draw_view()
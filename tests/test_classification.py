@@ -0,0 +1,90 @@
+"""Classification Tests
+
+Tests of the shapes which equations are classified as.
+
+Written by Sam Hubbard - samlhub@gmail.com
+Copyright (C) 2015 Sam Hubbard
+"""
+
+import os
+import sys
+import unittest
+from fractions import Fraction
+
+sys.path.insert(
+    0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from classification import *
+from contour import trace
+
+
+class TestChainedRelations(unittest.TestCase):
+    """Checks the classification of chained relations."""
+
+    def classify(self, equation):
+        """Classify an equation, which must succeed."""
+        result = classify_equation(equation)
+        self.assertIsNotNone(result, "Couldn't classify %r" % equation)
+        return result
+
+    def assertDisk(self, equation, radius, relation):
+        """Assert that an equation is a disk about the origin."""
+        result = self.classify(equation)
+        self.assertEqual(result.type, TYPE_DISK)
+        self.assertEqual(result.relation, relation)
+        self.assertEqual(
+            (result.shape.center.x, result.shape.center.y), (0, 0))
+        self.assertEqual(result.shape.radius, radius)
+
+    def test_annulus(self):
+        result = self.classify("1 < |z| < 2")
+        self.assertEqual(result.type, TYPE_ANNULUS)
+        self.assertEqual((result.shape.inner, result.shape.outer), (1, 2))
+
+    def test_negative_inner_bound(self):
+        # The modulus is more than a negative bound everywhere,
+        # so only the outer bound is left.
+        self.assertDisk("-1 < |z| < 2", 2, REL_LESS)
+        self.assertDisk("-1 <= |z| <= 2", 2, REL_LEQL)
+        self.assertDisk("2 > |z| > -1", 2, REL_LESS)
+
+    def test_negative_inner_bound_exact(self):
+        result = classify_equation("-1/3 < |z - 1/3| <= 2/3", exact=True)
+        self.assertEqual(result.type, TYPE_DISK)
+        self.assertEqual(result.relation, REL_LEQL)
+        self.assertEqual(result.exact_shape.radius, Fraction(2, 3))
+
+    def test_whole_plane(self):
+        for equation in ["|z| > -1", "|z - 1| >= -2", "-1 < |z| >= -2"]:
+            self.assertEqual(self.classify(equation).type, TYPE_PLANE)
+
+    def test_empty(self):
+        for equation in [
+                "|z| < -1", "|z| = -1", "-2 < |z| < -1", "2 < |z| < 1",
+                "|z| > 1j"]:
+            self.assertEqual(self.classify(equation).type, TYPE_NULL)
+
+
+class TestIdenticalSides(unittest.TestCase):
+    """Checks relations between identical halves."""
+
+    def test_whole_plane(self):
+        for equation in ["|z| = |z|", "sin(|z|) <= sin(|z|)", "z = z"]:
+            result = classify_equation(equation)
+            self.assertEqual(result.type, TYPE_PLANE, equation)
+
+    def test_strict(self):
+        for equation in ["|z| < |z|", "arg(z) > arg(z)"]:
+            result = classify_equation(equation)
+            self.assertEqual(result.type, TYPE_NULL, equation)
+
+    def test_zero_residual(self):
+        # Nothing is traced for a residual which is zero everywhere.
+        result = classify_equation("|z| - |z| = 0")
+        self.assertEqual(result.type, TYPE_CONTOUR)
+        self.assertEqual(
+            trace(result.shape, 1000, 700, Point(-10, -7), 50), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
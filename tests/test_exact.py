@@ -0,0 +1,53 @@
+"""Exact Arithmetic Tests
+
+Tests of ExactComplex numbers.
+
+Written by Sam Hubbard - samlhub@gmail.com
+Copyright (C) 2015 Sam Hubbard
+"""
+
+import os
+import sys
+import unittest
+from fractions import Fraction
+
+sys.path.insert(
+    0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from exact import ExactComplex
+
+
+class TestExactComplex(unittest.TestCase):
+    """Checks ExactComplex numbers against Python's numbers."""
+
+    def test_hash(self):
+        # Numbers which compare equal must have the same hash.
+        pairs = [
+            (ExactComplex(1), 1), (ExactComplex(1), 1.0),
+            (ExactComplex(1), 1 + 0j), (ExactComplex(0), 0),
+            (ExactComplex(-2, 3), -2 + 3j),
+            (ExactComplex(Fraction(1, 2), Fraction(-3, 4)), 0.5 - 0.75j),
+            (ExactComplex(Fraction(1, 3)), Fraction(1, 3)),
+            (ExactComplex(10 ** 400), 10 ** 400)]
+        for number, other in pairs:
+            self.assertEqual(number, other)
+            self.assertEqual(hash(number), hash(other), repr(number))
+
+    def test_lookup(self):
+        table = {1 + 0j: "one", 0.5j: "half", Fraction(1, 3): "third"}
+        self.assertEqual(table[ExactComplex(1)], "one")
+        self.assertEqual(table[ExactComplex(0, Fraction(1, 2))], "half")
+        self.assertEqual(table[ExactComplex(Fraction(1, 3))], "third")
+        self.assertEqual(len({ExactComplex(2, 1), 2 + 1j}), 1)
+
+    def test_inexact(self):
+        # Numbers with no float equivalent are only equal to themselves.
+        number = ExactComplex(Fraction(1, 3), 1)
+        self.assertNotEqual(number, complex(number))
+        self.assertEqual(hash(number), hash(ExactComplex(Fraction(1, 3), 1)))
+        large = ExactComplex(10 ** 400, 1)
+        self.assertEqual(hash(large), hash(ExactComplex(10 ** 400, 1)))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,84 @@
+"""Incremental Parsing Tests
+
+Tests that an incremental SyntaxParser following a sequence of edits
+parses each of them the same way as a fresh parser.
+
+Written by Sam Hubbard - samlhub@gmail.com
+Copyright (C) 2015 Sam Hubbard
+"""
+
+import os
+import random
+import sys
+import unittest
+
+sys.path.insert(
+    0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from abstract_syntax_tree import *
+import test_pratt
+
+
+SEED = 2015
+# The number of sequences of edits, and the edits in each.
+SEQUENCES = 300
+SEQUENCE_LENGTH = 10
+
+# A long equation, which is edited in the middle.
+LONG_EQUATION = "|" + " + ".join(
+    "(z * %d - %dj) / (z + %d)" % (i, i, i + 1) for i in range(60)) + "| < 5"
+
+
+def outcome(parser):
+    """Describe the tree or the error from a parser's last parse."""
+    error = parser.error
+    if error is None:
+        return test_pratt.describe(parser.tree), None
+    if isinstance(error, ParseError):
+        return None, (error.position, sorted(error.expected), str(error))
+    return None, (type(error).__name__, str(error))
+
+
+class TestIncremental(unittest.TestCase):
+    """Checks incremental parses against fresh ones."""
+
+    def assertSameParse(self, parser, equation):
+        """Update the parser, and compare it with a fresh parse."""
+        parser.update(equation)
+        fresh = SyntaxParser(equation)
+        fresh.get_tree()
+        self.assertEqual(
+            outcome(parser), outcome(fresh), "Parses differ on %r" % equation)
+        return fresh
+
+    def test_random_edits(self):
+        rand = random.Random(SEED)
+        equations = test_pratt.corpus(seed=SEED, size=SEQUENCES // 3)
+        parser = SyntaxParser("", incremental=True)
+        for equation in equations:
+            for _ in range(SEQUENCE_LENGTH):
+                equation = test_pratt.mutate(rand, equation)
+                self.assertSameParse(parser, equation)
+
+    def test_typing(self):
+        parser = SyntaxParser("", incremental=True)
+        equation = "|z^2 + sin(z - 1)| / 2 <= arg(z + 3j) < 1.5"
+        for end in range(len(equation) + 1):
+            self.assertSameParse(parser, equation[:end])
+        for end in reversed(range(len(equation))):
+            self.assertSameParse(parser, equation[:end])
+
+    def test_reuse(self):
+        # Edits in the middle of a long equation, valid or not, only
+        # match the edited region again.
+        middle = len(LONG_EQUATION) // 2
+        for edit in [" + 7 ", " + * "]:
+            parser = SyntaxParser(LONG_EQUATION, incremental=True)
+            parser.get_tree()
+            equation = LONG_EQUATION[:middle] + edit + LONG_EQUATION[middle:]
+            fresh = self.assertSameParse(parser, equation)
+            self.assertLess(parser.match_count, fresh.match_count // 4)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,146 @@
+"""Pratt Parser Tests
+
+Differential tests comparing the Pratt engine with the packrat engine
+over a seeded corpus of generated equations.
+
+Written by Sam Hubbard - samlhub@gmail.com
+Copyright (C) 2015 Sam Hubbard
+"""
+
+import os
+import random
+import sys
+import unittest
+
+sys.path.insert(
+    0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from abstract_syntax_tree import *
+
+
+SEED = 2015
+# The number of equations generated at each depth of nesting.
+CORPUS_SIZE = 1000
+DEPTHS = [1, 3, 5]
+
+ATOMS = ["z", "w", "1", "2.5", "3j", "0.5j", "j", "10", "."]
+FUNCTIONS = ["sin", "cos", "tan", "sqrt", "arg"]
+BINARY = ["+", "-", "*", "/", "^"]
+RELATIONS = ["<", "<=", "=", ">=", ">"]
+# Characters inserted or deleted to break equations.
+NOISE = "z1.+-*/^()|<= "
+
+
+def expression(rand, depth):
+    """Generate a random expression.
+
+    Args:
+        rand: The random.Random to draw from.
+        depth: The deepest the expression may be nested.
+    """
+    choice = rand.random()
+    if depth <= 0 or choice < 0.25:
+        return rand.choice(ATOMS)
+    if choice < 0.6:
+        return (expression(rand, depth - 1) + rand.choice(BINARY)
+                + expression(rand, depth - 1))
+    if choice < 0.7:
+        return "(" + expression(rand, depth - 1) + ")"
+    if choice < 0.8:
+        return "|" + expression(rand, depth - 1) + "|"
+    if choice < 0.87:
+        return (rand.choice(FUNCTIONS) + " ("
+                + expression(rand, depth - 1) + ")")
+    return rand.choice("+-") + expression(rand, depth - 1)
+
+
+def equation(rand, depth):
+    """Generate a random equation, with relations chained up to twice."""
+    parts = [expression(rand, depth)]
+    for _ in range(rand.choice([1, 1, 1, 2])):
+        parts += [rand.choice(RELATIONS), expression(rand, depth)]
+    return " ".join(parts)
+
+
+def mutate(rand, string):
+    """Insert or delete a few characters, usually breaking the string."""
+    for _ in range(rand.randint(1, 3)):
+        index = rand.randrange(len(string) + 1)
+        if string and rand.random() < 0.5:
+            string = string[:index] + string[index + 1:]
+        else:
+            string = string[:index] + rand.choice(NOISE) + string[index:]
+    return string
+
+
+def corpus(seed=SEED, size=CORPUS_SIZE, depths=DEPTHS):
+    """Generate the corpus of equations, half of which are mutated."""
+    rand = random.Random(seed)
+    equations = []
+    for depth in depths:
+        for _ in range(size):
+            string = equation(rand, depth)
+            if rand.random() < 0.5:
+                string = mutate(rand, string)
+            equations.append(string)
+    return equations
+
+
+def describe(node):
+    """Convert a tree into nested tuples, which can be compared."""
+    if node is None:
+        return None
+    if node.type == NODE_TYPE_OP:
+        return (node.type, node.code,
+                tuple(describe(child) for child in node.children))
+    return (node.type, node.value)
+
+
+def outcome(equation, engine, exact=False):
+    """Parse an equation, describing the tree or the error."""
+    parser = SyntaxParser(equation, engine=engine, exact=exact)
+    tree = parser.get_tree()
+    error = parser.error
+    if error is None:
+        return describe(tree), None
+    if isinstance(error, ParseError):
+        return None, (error.position, sorted(error.expected), str(error))
+    return None, (type(error).__name__, str(error))
+
+
+class TestPratt(unittest.TestCase):
+    """Checks that both engines parse every equation the same way."""
+
+    def compare(self, equations, exact=False):
+        """Assert that the engines agree on every equation."""
+        valid = invalid = 0
+        for string in equations:
+            expected = outcome(string, ENGINE_PACKRAT, exact)
+            actual = outcome(string, ENGINE_PRATT, exact)
+            self.assertEqual(expected, actual, "Engines differ on %r" % string)
+            if expected[1] is None:
+                valid += 1
+            else:
+                invalid += 1
+        # Both valid and invalid equations must have been compared.
+        self.assertGreater(valid, len(equations) // 10)
+        self.assertGreater(invalid, len(equations) // 10)
+
+    def test_corpus(self):
+        self.compare(corpus())
+
+    def test_corpus_exact(self):
+        self.compare(corpus(seed=SEED + 1, size=CORPUS_SIZE // 4), exact=True)
+
+    def test_errors(self):
+        equations = [
+            "", "z", "z =", "= 1", "(z + 1 = 2", "z = 1)", "z = = 1",
+            "|z - 1 = 2", "z + * 1 = 2", "sin = 1", "1.2.3 = z", "z = .",
+            "z < 1 < 2 < 3", "z = 1 z", "z ^ = 1"]
+        for string in equations:
+            self.assertEqual(outcome(string, ENGINE_PACKRAT),
+                             outcome(string, ENGINE_PRATT), string)
+
+
+if __name__ == "__main__":
+    unittest.main()